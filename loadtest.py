@@ -0,0 +1,144 @@
+"""端到端压测：启动本地模拟论坛，用真实的 main.py 对其完整采集，报告吞吐量和响应耗时分位数
+
+示例：
+    python loadtest.py --mode all --topics-per-forum 100 --latency 0.05 --jitter 0.1 --error-rate 0.02
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import yaml
+
+from utils.fake_forum import FakeProxy, add_server_arguments, server_from_args
+from utils.manifest import read_jsonl, list_run_manifests
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def build_config(base_config_path: str, server, work_dir: str, args: argparse.Namespace, proxies: list) -> str:
+    """基于仓库配置生成压测配置：指向模拟论坛、输出到临时目录、关闭推送，返回配置文件路径"""
+    with open(base_config_path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    config.update(server.forum_config())
+    config['site_domain'] = server.url
+    config['crawl']['max_pages'] = 1000
+    config['request']['delay'] = args.delay
+    config.setdefault('retry', {})['base_delay'] = args.delay
+    config.setdefault('remote_repo', {})['enable'] = False
+    config.setdefault('manifest', {})['enable'] = True
+    config.setdefault('discovery', {})['mode'] = 'listing'
+    config['save_paths'] = {
+        'novel': os.path.join(work_dir, 'novel'),
+        'picture': os.path.join(work_dir, 'picture')
+    }
+    config['manifest']['dir'] = os.path.join(work_dir, 'manifests')
+    config.setdefault('search', {})['index_path'] = os.path.join(work_dir, 'search_index')
+    config['discovery']['state_path'] = os.path.join(work_dir, 'manifests', 'discovery_state.json')
+    if proxies:
+        config.setdefault('proxy_pool', {}).update(enable=True, proxies=[proxy.url for proxy in proxies])
+
+    config_path = os.path.join(work_dir, 'config.yaml')
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
+    return config_path
+
+
+def count_saved(manifest_dir: str) -> dict:
+    """按运行清单统计保存的条目数和字节数"""
+    saved = {'items': 0, 'bytes': 0}
+    for name in list_run_manifests(manifest_dir):
+        for entry in read_jsonl(os.path.join(manifest_dir, name)):
+            saved['items'] += 1
+            saved['bytes'] += entry.get('size', 0)
+    return saved
+
+
+def run(args: argparse.Namespace) -> dict:
+    server = server_from_args(args).start()
+    # 模拟代理：第一个代理按 --proxy-failure-rate 注入连接失败，其余正常
+    proxies = [
+        FakeProxy(latency=args.proxy_latency * (i + 1), failure_rate=args.proxy_failure_rate if i == 0 else 0.0,
+                  seed=args.seed + i).start()
+        for i in range(args.proxies)
+    ]
+    work_dir = tempfile.mkdtemp(prefix='loadtest-', dir=args.work_dir)
+    try:
+        config_path = build_config(args.config, server, work_dir, args, proxies)
+        command = [sys.executable, os.path.join(ROOT_DIR, 'main.py'), '--config', config_path, '--mode', args.mode]
+        if args.time_budget:
+            command += ['--time-budget', args.time_budget, '--time-reserve', '0']
+        if args.log_level:
+            command += ['--log-level', args.log_level]
+        print(f"模拟论坛：{server.url}，输出目录：{work_dir}")
+
+        start_time = time.monotonic()
+        # 在临时目录中运行，避免读取仓库中的 site_domain.yaml
+        with open(os.path.join(work_dir, 'crawler.log'), 'w', encoding='utf-8') as log:
+            returncode = subprocess.call(command, cwd=work_dir, stdout=log, stderr=subprocess.STDOUT)
+        elapsed = time.monotonic() - start_time
+    finally:
+        server.stop()
+        for proxy in proxies:
+            proxy.stop()
+
+    stats = server.stats()
+    saved = count_saved(os.path.join(work_dir, 'manifests'))
+    return {
+        'returncode': returncode,
+        'elapsed': round(elapsed, 2),
+        'work_dir': work_dir,
+        'saved_items': saved['items'],
+        'saved_bytes': saved['bytes'],
+        'items_per_second': round(saved['items'] / elapsed, 2) if elapsed else 0.0,
+        'mb_per_second': round(saved['bytes'] / elapsed / 1024 / 1024, 2) if elapsed else 0.0,
+        'requests': stats['requests'],
+        'requests_per_second': round(stats['requests'] / elapsed, 2) if elapsed else 0.0,
+        'status': stats['status'],
+        'kinds': stats['kinds'],
+        'latency': {key: round(value * 1000, 1) for key, value in stats['latency'].items()},
+        'proxy_requests': {proxy.url: proxy.requests for proxy in proxies}
+    }
+
+
+def print_report(report: dict):
+    print("\n===== 压测结果 =====")
+    print(f"退出码：{report['returncode']}，耗时 {report['elapsed']} 秒（日志：{report['work_dir']}/crawler.log）")
+    print(f"保存：{report['saved_items']} 项，{report['saved_bytes'] / 1024 / 1024:.1f} MB，"
+          f"{report['items_per_second']} 项/秒，{report['mb_per_second']} MB/秒")
+    print(f"请求：{report['requests']} 个，{report['requests_per_second']} 个/秒")
+    print(f"状态码：{report['status']}")
+    print(f"资源类型：{report['kinds']}")
+    latency = report['latency']
+    print(f"服务端响应耗时(ms)：p50 {latency['p50']}，p95 {latency['p95']}，p99 {latency['p99']}，max {latency['max']}")
+    if report['proxy_requests']:
+        print(f"代理请求数：{report['proxy_requests']}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='使用本地模拟论坛对爬虫进行端到端压测')
+    parser.add_argument('--mode', type=str, choices=['picture', 'novel', 'all'], default='all', help='采集模式')
+    parser.add_argument('--config', type=str, default=os.path.join(ROOT_DIR, 'config.yaml'), help='作为基础的配置文件')
+    parser.add_argument('--delay', type=float, default=0.0, help='爬虫请求间隔（秒），覆盖配置中的 request.delay')
+    parser.add_argument('--time-budget', type=str, help='传给爬虫的时间预算')
+    parser.add_argument('--log-level', type=str, choices=['summary', 'topic', 'request'], help='传给爬虫的日志级别')
+    parser.add_argument('--work-dir', type=str, help='临时输出目录的父目录，默认系统临时目录')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    parser.add_argument('--proxies', type=int, default=0, help='启动的模拟代理数，大于0时爬虫使用代理池')
+    parser.add_argument('--proxy-latency', type=float, default=0.0, help='模拟代理的转发延迟（秒），第i个代理为 i 倍')
+    parser.add_argument('--proxy-failure-rate', type=float, default=0.0, help='第一个模拟代理的连接失败比例')
+    add_server_arguments(parser)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    result = run(arguments)
+    if arguments.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+    sys.exit(result['returncode'])
@@ -1,71 +1,55 @@
-import yaml
 import argparse
 import os
-from utils.request import RequestHandler
-from utils.parser import HtmlParser
-from utils.saver import ContentSaver
-from utils.git import GitManager
+import json
+from utils.config import load_config, ConfigError
+from utils.search import NovelIndex
+from utils.manifest import Manifest, build_catalog, remap_catalog
+from utils.layout import SaveLayout
+from utils.shard import ShardSpec, merge_shards
+from utils.deadline import CrawlDeadline, parse_duration
+from utils.discovery import TopicDiscovery
+from utils.release import build_release
+from utils.log import get_logger, setup_logging, LEVELS
 
-import threading
 import time
 
-def get_fastest_domain(domains):
-    """简化版域名选择，直接返回第一个域名"""
-    if not domains:
-        return None
-    
-    # 简化处理，直接返回第一个域名，避免复杂的测速逻辑
-    # 由于当前环境存在代理问题，暂时不进行域名测速
-    fastest_domain = domains[0]
-    print(f"\n使用配置的第一个域名: {fastest_domain}")
-    return fastest_domain
+logger = get_logger('main')
 
-def load_config(config_path: str = 'config.yaml') -> dict:
-    """加载配置文件，从site_domain.yaml读取多个域名，选择最快的一个"""
-    # 加载主配置文件
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
-    
-    # 设置默认域名，防止config.yaml中没有配置
-    default_domain = 'wm.wmhuu.com'
-    if 'site_domain' not in config or config['site_domain'] is None:
-        config['site_domain'] = default_domain
-    
-    # 尝试从site_domain.yaml读取多个域名
-    try:
-        with open('site_domain.yaml', 'r', encoding='utf-8') as f:
-            site_config = yaml.safe_load(f)
+def publish_results(config: dict, commit_message: str, extra_files: list = None):
+    """推送结果到远程仓库（如果配置了）"""
+    if not config.get('remote_repo', {}).get('enable', False):
+        return
+    
+    remote_config = config['remote_repo']
+    remote_url = remote_config['url']
+    branch = remote_config['branch']
+    username = remote_config['username']
+    email = remote_config['email']
+    
+    if remote_url:
+        logger.summary("=== 开始推送结果到远程仓库 ===")
+        from utils.git import GitManager
+        git_manager = GitManager(username=username, email=email)
         
-        if site_config and 'site_domains' in site_config:
-            domains = site_config['site_domains']
-            # 选择最快的域名
-            fastest_domain = get_fastest_domain(domains)
-            
-            if fastest_domain:
-                # 更新config.yaml文件
-                config['site_domain'] = fastest_domain
-                print(f"更新config.yaml中的域名: {fastest_domain}")
-                # 保存更新后的配置到文件
-                with open(config_path, 'w', encoding='utf-8') as f:
-                    yaml.dump(config, f, default_flow_style=False, allow_unicode=True)
-            else:
-                # 所有域名测试失败，使用默认域名
-                print(f"所有域名测试失败，使用默认域名: {config['site_domain']}")
-        elif site_config and 'site_domain' in site_config:
-            # 兼容旧格式，单个域名
-            config['site_domain'] = site_config['site_domain']
-            print(f"从site_domain.yaml加载单个域名: {site_config['site_domain']}")
+        # 要推送的文件列表
+        files_to_push = ['./picture', './novel'] + (extra_files or [])
+        
+        # 推送结果
+        success = git_manager.push_results(
+            remote_url=remote_url,
+            branch_name=branch,
+            files=files_to_push,
+            commit_message=commit_message,
+            username=username,
+            email=email
+        )
+        
+        if success:
+            logger.summary("=== 结果推送完成 ===")
         else:
-            # 没有找到域名配置，使用config.yaml中的域名
-            print(f"使用config.yaml中的域名: {config['site_domain']}")
-    except FileNotFoundError:
-        # site_domain.yaml不存在，使用config.yaml中的域名
-        print(f"site_domain.yaml不存在，使用config.yaml中的域名: {config['site_domain']}")
-    except Exception as e:
-        print(f"读取site_domain.yaml失败: {e}")
-        print(f"使用config.yaml中的域名: {config['site_domain']}")
-    
-    return config
+            logger.error("=== 结果推送失败 ===")
+    else:
+        logger.summary("=== 远程仓库 URL 未配置，跳过推送 ===")
 
 def parse_args() -> argparse.Namespace:
     """解析命令行参数"""
@@ -73,6 +57,22 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument('--mode', type=str, choices=['picture', 'novel', 'all'], default='all', help='采集模式：picture(图片)、novel(小说)或all(全部)')
     parser.add_argument('--config', type=str, default='config.yaml', help='配置文件路径')
     parser.add_argument('--daily', action='store_true', help='仅采集当日数据')
+    parser.add_argument('--search', type=str, metavar='QUERY', help='在已保存的小说中全文搜索，不进行采集')
+    parser.add_argument('--limit', type=int, default=20, help='搜索结果数量')
+    parser.add_argument('--rebuild-index', action='store_true', help='增量索引小说目录中尚未入库的文件，不进行采集')
+    parser.add_argument('--build-catalog', action='store_true', help='合并运行清单生成全局目录，不进行采集')
+    parser.add_argument('--package-release', action='store_true', help='把上次发布之后新保存的条目打包为增量归档并更新发布索引，不进行采集')
+    parser.add_argument('--release-name', type=str, help='增量归档名称，默认为当前时间')
+    parser.add_argument('--migrate-layout', action='store_true', help='把已有的平铺保存目录迁移为哈希分片布局，不进行采集')
+    parser.add_argument('--shard', type=str, default='0/1', metavar='i/N', help='横向分片：只处理N个分片中的第i个（i从0开始）')
+    parser.add_argument('--shard-by', type=str, choices=['topic', 'forum'], default='topic', help='分片方式：按帖子ID哈希或按版块哈希')
+    parser.add_argument('--output-dir', type=str, help='输出根目录，保存目录、清单和索引都放在该目录下（本地多进程分片时使用）')
+    parser.add_argument('--discovery', type=str, choices=['listing', 'delta', 'auto'], help='新帖子发现方式：listing(翻页遍历版块)、delta(按帖子ID探测)、auto(定期翻页对账，其余时间按ID探测)')
+    parser.add_argument('--time-budget', type=str, help='时间预算（秒，或带 s/m/h 后缀），到时前停止接收新任务并完成保存和推送')
+    parser.add_argument('--time-reserve', type=str, default='300', help='时间预算中为保存、合并目录和推送预留的时间，默认300秒')
+    parser.add_argument('--log-level', type=str, choices=list(LEVELS), help='控制台日志级别：summary(仅摘要)、topic(每个帖子)、request(每个请求和文件)，默认使用配置')
+    parser.add_argument('--log-file', type=str, help='同时以JSON Lines格式写入的日志文件')
+    parser.add_argument('--merge-shards', type=str, nargs='+', metavar='DIR', help='合并各分片的输出目录到当前目录并去重，然后按配置推送')
     return parser.parse_args()
 
 def main():
@@ -80,8 +80,127 @@ def main():
     # 解析命令行参数
     args = parse_args()
     
-    # 加载配置文件
-    config = load_config(args.config)
+    # 先按命令行参数启用日志，加载配置后按配置重新设置
+    setup_logging(args.log_level or 'topic', log_file=args.log_file)
+    
+    # 加载配置文件（校验后缓存，不修改配置文件）
+    try:
+        config = load_config(args.config)
+    except ConfigError as e:
+        logger.error("%s", e)
+        return
+    
+    log_config = config.get('logging', {})
+    setup_logging(
+        args.log_level or log_config.get('level', 'topic'),
+        log_file=args.log_file or log_config.get('file'),
+        file_level=log_config.get('file_level'),
+        burst=log_config.get('rate_limit_burst', 5),
+        interval=log_config.get('rate_limit_interval', 60)
+    )
+    
+    # 分片和时间预算参数
+    try:
+        shard = ShardSpec.parse(args.shard, by=args.shard_by)
+        time_budget = parse_duration(args.time_budget)
+        time_reserve = parse_duration(args.time_reserve)
+    except ValueError as e:
+        logger.error("%s", e)
+        return
+    
+    # 输出根目录：保存目录、清单和索引都放到该目录下
+    if args.output_dir:
+        config['save_paths'] = {
+            key: os.path.join(args.output_dir, os.path.basename(os.path.normpath(path)))
+            for key, path in config['save_paths'].items()
+        }
+        config.setdefault('manifest', {})['dir'] = os.path.join(args.output_dir, 'manifests')
+        config.setdefault('search', {})['index_path'] = os.path.join(args.output_dir, 'search_index')
+        discovery_config = config.setdefault('discovery', {})
+        discovery_config['seed_path'] = discovery_config.get('state_path', './manifests/discovery_state.json')
+        discovery_config['state_path'] = os.path.join(args.output_dir, 'manifests', 'discovery_state.json')
+    
+    # 分片运行时必须记录清单，合并步骤依赖清单去重
+    if shard.enabled:
+        config.setdefault('manifest', {})['enable'] = True
+    
+    # 全文索引
+    search_config = config.get('search', {})
+    search_index = None
+    if search_config.get('enable', False) or args.search or args.rebuild_index:
+        search_index = NovelIndex(search_config.get('index_path', './search_index'))
+    
+    if args.rebuild_index:
+        added = search_index.update_from_directory(config['save_paths']['novel'])
+        search_index.compact()
+        logger.summary("索引更新完成，新增 %s 篇小说", added)
+        return
+    
+    manifest_config = config.get('manifest', {})
+    manifest_dir = manifest_config.get('dir', './manifests')
+    if args.build_catalog:
+        build_catalog(manifest_dir)
+        return
+    
+    if args.package_release:
+        release_config = config.get('release', {})
+        build_release(
+            manifest_dir,
+            release_config.get('dir', './release'),
+            name=args.release_name,
+            workers=release_config.get('workers') or None,
+            level=release_config.get('level', 6),
+            chunk_size=release_config.get('chunk_mb', 4) * 1024 * 1024
+        )
+        return
+    
+    if args.merge_shards:
+        stats = merge_shards(args.merge_shards, manifest_dir)
+        # 合并各分片的帖子ID发现状态
+        state_path = config.get('discovery', {}).get('state_path', os.path.join(manifest_dir, 'discovery_state.json'))
+        discovery = TopicDiscovery(state_path)
+        for shard_dir in args.merge_shards:
+            shard_state = os.path.join(shard_dir, 'manifests', os.path.basename(state_path))
+            if os.path.exists(shard_state):
+                with open(shard_state, 'r', encoding='utf-8') as f:
+                    discovery.merge_state(json.load(f))
+                discovery.save()
+        if search_index:
+            search_index.update_from_directory(config['save_paths']['novel'])
+        commit_message = f"Merge shard results: {len(args.merge_shards)} shards, total={stats['copied']}"
+        publish_results(config, commit_message, [manifest_dir])
+        return
+    
+    layout_config = config.get('save_layout', {})
+    layout = SaveLayout(
+        mode=layout_config.get('mode', 'flat'),
+        depth=layout_config.get('depth', 2),
+        width=layout_config.get('width', 2)
+    )
+    if args.migrate_layout:
+        if not layout.sharded:
+            layout = SaveLayout(mode='sharded', depth=layout.depth, width=layout.width)
+            logger.summary("提示：迁移后请在配置中设置 save_layout.mode: sharded")
+        moved = {}
+        for root in config['save_paths'].values():
+            moved.update(layout.migrate(root))
+        # 同步更新目录和索引中的路径；先合并尚未合并的运行清单，使其条目也能按目录解析到新路径（见增量发布）
+        build_catalog(manifest_dir)
+        changed = remap_catalog(manifest_dir, moved)
+        if search_index:
+            changed += search_index.rename_paths(moved)
+        logger.summary("迁移完成：移动 %s 个条目，更新 %s 条记录", len(moved), changed)
+        return
+    
+    if args.search:
+        start_time = time.perf_counter()
+        hits = search_index.search(args.search, limit=args.limit)
+        elapsed = (time.perf_counter() - start_time) * 1000
+        # 查询结果是命令的输出，直接写到标准输出，不受日志级别和限流影响
+        for i, hit in enumerate(hits, 1):
+            print(f"{i:3}. [{hit['score']:.2f}] {hit['title']}  {hit['path']}", flush=True)
+        logger.summary("共 %s 条结果，耗时 %.1f ms", len(hits), elapsed)
+        return
     
     # 命令行参数覆盖配置
     if args.mode:
@@ -103,202 +222,165 @@ def main():
         save_paths['picture'] = os.path.join(save_paths['picture'], daily_prefix)
         save_paths['novel'] = os.path.join(save_paths['novel'], daily_prefix)
     
+    # 采集才需要的模块（requests、bs4）在这里导入，搜索、合并、打包等命令不加载
+    from utils.request import RequestHandler
+    from utils.retry import RetryPolicy, CircuitBreaker
+    from utils.proxy_pool import ProxyPool
+    from utils.parser import HtmlParser
+    from utils.saver import ContentSaver
+    from utils.writer import WriteBehindWriter
+    from utils.prefilter import ImagePrefilter
+    from utils.crawler import Crawler
+    
+    # 重试策略：指数退避加抖动、全局重试预算、按主机熔断
+    retry_config = config.get('retry', {})
+    retry_policy = RetryPolicy(
+        max_attempts=config['crawl']['retry_times'],
+        base_delay=retry_config.get('base_delay', config['request']['delay']),
+        max_delay=retry_config.get('max_delay', 30),
+        retry_budget=retry_config.get('budget', 500),
+        breaker=CircuitBreaker(
+            failure_threshold=retry_config.get('breaker_threshold', 5),
+            reset_timeout=retry_config.get('breaker_reset', 30)
+        )
+    )
+    
+    # 时间预算，从启动时开始计时
+    deadline = None
+    if time_budget:
+        deadline = CrawlDeadline(time_budget, reserve=time_reserve or 0.0)
+        logger.summary("时间预算：%.0f 秒，预留收尾 %.0f 秒", time_budget, deadline.reserve)
+    
+    # 上游代理池：请求经健康度最好的代理发出，连续失败的代理自动隔离
+    proxy_pool = None
+    pool_config = config.get('proxy_pool', {})
+    if pool_config.get('enable', False) and pool_config.get('proxies'):
+        proxy_pool = ProxyPool(
+            pool_config['proxies'],
+            max_in_flight=pool_config.get('max_in_flight', 4),
+            failure_threshold=pool_config.get('failure_threshold', 3),
+            quarantine=pool_config.get('quarantine', 60),
+            acquire_timeout=pool_config.get('acquire_timeout', 60)
+        )
+        logger.summary("使用代理池：%s 个代理", len(proxy_pool.proxies))
+    
     # 初始化组件
     request_handler = RequestHandler(
         headers=config['request']['headers'],
         timeout=config['request']['timeout'],
         delay=config['request']['delay'],
         retry_times=config['crawl']['retry_times'],
-        proxies=config['request']['proxies']
+        proxies=config['request']['proxies'],
+        max_body_size=config['request'].get('max_body_size', 5 * 1024 * 1024),
+        max_file_size=config['request'].get('max_file_size', 50 * 1024 * 1024),
+        retry_policy=retry_policy,
+        proxy_pool=proxy_pool
     )
     
     parser = HtmlParser()
-    saver = ContentSaver(save_paths)
-    
-    # 导入日期处理模块
-    from datetime import datetime
-    
-    # 获取当前日期，格式：MM-DD
-    current_date = datetime.now().strftime('%m-%d')
-    
-    def is_today_post(title):
-        """判断帖子标题是否为当日发布"""
-        import re
-        # 匹配标题中的日期格式：[MM-DD]
-        match = re.search(r'\[(\d{2}-\d{2})\]', title)
-        if match:
-            post_date = match.group(1)
-            return post_date == current_date
-        return False
-    
-    # 定义爬取单个模式的函数
-    def crawl_single_mode(mode):
-        """爬取单个模式"""
-        print(f"\n===== 开始采集 {mode} 模式{'，仅采集当日数据' if daily_mode else ''} =====")
-        print(f"当前日期：{current_date}")
-        
-        # 选择要爬取的版块
-        if mode == 'picture':
-            forums = config['picture_forums']
-        else:
-            forums = config['novel_forums']
-        
-        mode_topics = 0
-        mode_saved = 0
-        
-        # 遍历每个版块
-        for forum in forums:
-            forum_id = forum['id']
-            forum_name = forum['name']
-            print(f"\n=== 开始爬取版块：{forum_name} (ID: {forum_id}) ===")
-            
-            # 使用配置文件中的域名
-            site_domain = config['site_domain']
-            forum_url = f'https://{site_domain}/viewforum/{forum_id}'
-            current_page = 1
-            
-            # 遍历版块的所有页面
-            while current_page <= config['crawl']['max_pages']:
-                print(f"\n--- 第 {current_page} 页 ---")
-                
-                # 发送请求获取页面内容
-                page_html = request_handler.get(forum_url)
-                if not page_html:
-                    print(f"获取页面失败：{forum_url}")
-                    break
-                
-                # 解析帖子列表
-                topics = parser.parse_forum_page(page_html, site_domain=site_domain)
-                if not topics:
-                    print(f"未找到帖子：{forum_url}")
-                    break
-                
-                # 过滤当日帖子（如果是daily模式）
-                if daily_mode:
-                    filtered_topics = [topic for topic in topics if is_today_post(topic['title'])]
-                    print(f"找到 {len(topics)} 个帖子，其中当日帖子 {len(filtered_topics)} 个")
-                    topics = filtered_topics
-                    if not topics:
-                        print(f"本页没有当日帖子，继续下一页")
-                        break
-                else:
-                    print(f"找到 {len(topics)} 个帖子")
-                
-                # 遍历每个帖子
-                for topic in topics:
-                    mode_topics += 1
-                    print(f"\n处理帖子：{topic['title']}")
-                    
-                    # 获取帖子详情页内容
-                    topic_html = request_handler.get(topic['url'])
-                    if not topic_html:
-                        print(f"获取帖子详情失败：{topic['url']}")
-                        continue
-                    
-                    # 解析帖子内容
-                    topic_content = parser.parse_topic_page(topic_html, mode, site_domain=site_domain)
-                    
-                    # 保存内容
-                    if mode == 'picture':
-                        # 保存图片
-                        if topic_content['images']:
-                            saved_count = saver.save_pictures(topic['title'], topic_content['images'], request_handler)
-                            mode_saved += saved_count
-                            print(f"帖子 {topic['title']} 保存了 {saved_count} 张图片")
-                        else:
-                            print(f"帖子 {topic['title']} 没有找到图片")
-                    else:
-                        # 保存小说
-                        if topic_content['content']:
-                            if saver.save_novel(topic['title'], topic_content['content']):
-                                mode_saved += 1
-                                print(f"小说 {topic['title']} 保存成功")
-                            else:
-                                print(f"小说 {topic['title']} 保存失败")
-                        else:
-                            print(f"帖子 {topic['title']} 没有找到小说内容")
-                
-                # 检查是否有下一页
-                if parser.has_next_page(page_html):
-                    next_url = parser.get_next_page_url(forum_url, page_html, site_domain=site_domain)
-                    if next_url:
-                        forum_url = next_url
-                        current_page += 1
-                    else:
-                        break
-                else:
-                    break
-        
-        print(f"\n===== {mode} 模式采集完成 =====")
-        print(f"{mode} 模式处理帖子：{mode_topics} 个")
-        print(f"{mode} 模式保存内容：{mode_saved} 项")
-        
-        return mode_topics, mode_saved
     
-    total_topics = 0
-    total_saved = 0
+    # 新帖子发现方式：翻页遍历版块，或按帖子ID增量探测
+    discovery_config = config.get('discovery', {})
+    discovery_mode = args.discovery or discovery_config.get('mode', 'listing')
+    discovery = None
+    use_delta = False
+    if discovery_mode != 'listing':
+        discovery = TopicDiscovery(
+            discovery_config.get('state_path', os.path.join(manifest_dir, 'discovery_state.json')),
+            request_handler=request_handler,
+            concurrency=discovery_config.get('concurrency', 8),
+            max_gap=discovery_config.get('max_gap', 20),
+            max_probe=discovery_config.get('max_probe', 1000),
+            reconcile_days=discovery_config.get('reconcile_days', 7),
+            seed_path=discovery_config.get('seed_path')
+        )
+        use_delta = discovery_mode == 'delta' or not discovery.needs_reconcile()
+        if discovery_mode == 'delta' and not discovery.state['max_topic_id']:
+            logger.summary("没有帖子ID记录，先使用翻页遍历建立记录")
+            use_delta = False
+        logger.summary("新帖子发现方式：%s", '按帖子ID探测' if use_delta else '翻页遍历版块')
+    
+    manifest = None
+    if manifest_config.get('enable', False):
+        suffix = f'-shard{shard.index}of{shard.count}' if shard.enabled else ''
+        manifest = Manifest(manifest_dir, suffix=suffix)
+    # 后写式存储：采集线程只提交内容，由专用I/O线程批量写盘
+    writer = None
+    storage_config = config.get('storage', {})
+    if storage_config.get('write_behind', False):
+        writer = WriteBehindWriter(
+            workers=storage_config.get('io_workers', 2),
+            max_pending_bytes=storage_config.get('max_pending_mb', 64) * 1024 * 1024,
+            batch_size=storage_config.get('batch_size', 32),
+            fsync=storage_config.get('fsync', 'none')
+        )
+    saver = ContentSaver(save_paths, search_index=search_index, manifest=manifest, layout=layout, writer=writer)
+    
+    # 图片预过滤（下载前丢弃过小或过大的图片）
+    image_filter = None
+    filter_config = config.get('image_filter', {})
+    if filter_config.get('enable', False):
+        image_filter = ImagePrefilter(
+            request_handler,
+            min_width=filter_config.get('min_width', 100),
+            min_height=filter_config.get('min_height', 100),
+            min_bytes=filter_config.get('min_bytes', 2048),
+            max_bytes=filter_config.get('max_bytes', 20 * 1024 * 1024),
+            probe_bytes=filter_config.get('probe_bytes', 1024)
+        )
+    
+    crawler = Crawler(
+        config, request_handler=request_handler, parser=parser, sink=saver, daily=daily_mode,
+        shard=shard, deadline=deadline, discovery=discovery, image_filter=image_filter
+    )
     
     # 根据采集模式执行爬取
-    if crawl_mode == 'all':
-        # 爬取所有模式
-        print(f"开始采集，模式：all{'，仅采集当日数据' if daily_mode else ''}")
-        print(f"当日数据保存路径：{save_paths}")
-        
-        # 先爬取图片模式
-        pic_topics, pic_saved = crawl_single_mode('picture')
-        total_topics += pic_topics
-        total_saved += pic_saved
-        
-        # 再爬取小说模式
-        novel_topics, novel_saved = crawl_single_mode('novel')
-        total_topics += novel_topics
-        total_saved += novel_saved
+    if use_delta:
+        modes = ['novel', 'picture'] if crawl_mode == 'all' else [crawl_mode]
     else:
-        # 爬取单个模式
-        print(f"开始采集，模式：{crawl_mode}{'，仅采集当日数据' if daily_mode else ''}")
-        print(f"当日数据保存路径：{save_paths}")
-        topics, saved = crawl_single_mode(crawl_mode)
-        total_topics += topics
-        total_saved += saved
+        logger.summary("开始采集，模式：%s%s", crawl_mode, '，仅采集当日数据' if daily_mode else '')
+        logger.summary("当日数据保存路径：%s", save_paths)
+        modes = None
+    for _ in crawler.crawl(modes, delta=use_delta):
+        pass
+    total_topics, submitted = crawler.totals()
+    
+    # 保存数量以实际写入成功为准（后写模式下等写盘完成后统计）
+    saver.close()
+    total_saved = sum(saver.saved.values())
+    if total_saved < submitted:
+        logger.warning("%s 项内容写入失败", submitted - total_saved)
     
-    print(f"\n=== 全部采集完成 ===")
-    print(f"总共处理帖子：{total_topics} 个")
-    print(f"总共保存内容：{total_saved} 项")
+    # 保存帖子ID发现状态，完整翻页遍历过的记为一次对账（中途停止时下次仍需对账）
+    if discovery:
+        if not use_delta and not crawler.stopped:
+            discovery.mark_reconciled()
+        discovery.save()
+    
+    # 合并本次运行清单到全局目录
+    if manifest:
+        logger.summary("本次运行清单：%s（%s 条）", manifest.path, manifest.count)
+        build_catalog(manifest_dir)
+    
+    logger.summary("=== 全部采集完成 ===")
+    logger.summary("总共处理帖子：%s 个", total_topics)
+    logger.summary("总共保存内容：%s 项", total_saved)
+    if deadline:
+        logger.summary(deadline.summary())
+    if proxy_pool:
+        logger.summary("代理池状态：\n%s", proxy_pool.summary())
+    
+    # 分片运行只输出本分片结果，由合并步骤统一推送
+    if shard.enabled:
+        logger.summary("分片 %s 运行完成，跳过推送，请使用 --merge-shards 合并后推送", shard)
+        return
     
     # 推送结果到远程仓库（如果配置了）
-    if config.get('remote_repo', {}).get('enable', False):
-        remote_config = config['remote_repo']
-        remote_url = remote_config['url']
-        branch = remote_config['branch']
-        username = remote_config['username']
-        email = remote_config['email']
-        
-        if remote_url:
-            print(f"\n=== 开始推送结果到远程仓库 ===")
-            git_manager = GitManager(username=username, email=email)
-            
-            # 要推送的文件列表
-            files_to_push = ['./picture', './novel']
-            
-            # 生成提交信息
-            commit_message = f"Crawl results: {crawl_mode} mode, daily={daily_mode}, total={total_saved}"
-            
-            # 推送结果
-            success = git_manager.push_results(
-                remote_url=remote_url,
-                branch_name=branch,
-                files=files_to_push,
-                commit_message=commit_message,
-                username=username,
-                email=email
-            )
-            
-            if success:
-                print("=== 结果推送完成 ===")
-            else:
-                print("=== 结果推送失败 ===")
-        else:
-            print("=== 远程仓库 URL 未配置，跳过推送 ===")
+    files_to_push = [manifest_dir] if manifest else []
+    if discovery and os.path.dirname(discovery.state_path) not in files_to_push:
+        files_to_push.append(discovery.state_path)
+    commit_message = f"Crawl results: {crawl_mode} mode, daily={daily_mode}, total={total_saved}"
+    publish_results(config, commit_message, files_to_push)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""启动耗时基准：多次启动 main.py 执行不采集的命令，分别测量无配置缓存和有配置缓存时的耗时，
+以及采集模块（requests、bs4）的导入耗时，即非采集命令通过延迟导入省下的时间
+
+示例：
+    python startup_bench.py --runs 20
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def time_command(command: list, cwd: str, runs: int, before=None) -> list:
+    """运行命令 runs 次，返回每次的耗时（毫秒）；before 在每次运行前调用（如清除缓存）"""
+    samples = []
+    for _ in range(runs):
+        if before:
+            before()
+        start_time = time.perf_counter()
+        subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start_time) * 1000)
+    return samples
+
+
+def summarize(samples: list) -> dict:
+    return {
+        'median': round(statistics.median(samples), 1),
+        'min': round(min(samples), 1),
+        'max': round(max(samples), 1)
+    }
+
+
+def run(args: argparse.Namespace) -> dict:
+    work_dir = tempfile.mkdtemp(prefix='startup-', dir=args.work_dir)
+    try:
+        # 在临时目录中运行，使用仓库配置的副本
+        shutil.copy(args.config, os.path.join(work_dir, 'config.yaml'))
+        domain_path = os.path.join(ROOT_DIR, 'site_domain.yaml')
+        if os.path.exists(domain_path):
+            shutil.copy(domain_path, work_dir)
+        os.makedirs(os.path.join(work_dir, 'manifests'), exist_ok=True)
+        cache_dir = os.path.join(work_dir, '.cache')
+
+        def clear_cache():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        python = [sys.executable]
+        command = python + [os.path.join(ROOT_DIR, 'main.py'), '--config', 'config.yaml',
+                            '--build-catalog', '--log-level', 'summary']
+        crawl_imports = python + ['-c', 'import sys; sys.path.insert(0, sys.argv[1]); import utils.crawler', ROOT_DIR]
+        return {
+            'runs': args.runs,
+            'interpreter': summarize(time_command(python + ['-c', 'pass'], work_dir, args.runs)),
+            'cold_cache': summarize(time_command(command, work_dir, args.runs, before=clear_cache)),
+            'warm_cache': summarize(time_command(command, work_dir, args.runs)),
+            'crawl_imports': summarize(time_command(crawl_imports, work_dir, args.runs))
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def print_report(report: dict):
+    print(f"===== 启动耗时（{report['runs']} 次，毫秒，中位数/最小/最大） =====")
+    labels = {
+        'interpreter': 'Python 解释器空启动',
+        'cold_cache': 'main.py --build-catalog（无配置缓存）',
+        'warm_cache': 'main.py --build-catalog（有配置缓存）',
+        'crawl_imports': '解释器 + 导入采集模块'
+    }
+    for key, label in labels.items():
+        stats = report[key]
+        print(f"{label}：{stats['median']} / {stats['min']} / {stats['max']}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='测量 main.py 的启动耗时')
+    parser.add_argument('--runs', type=int, default=10, help='每项测量的运行次数')
+    parser.add_argument('--config', type=str, default=os.path.join(ROOT_DIR, 'config.yaml'), help='使用的配置文件')
+    parser.add_argument('--work-dir', type=str, help='临时目录的父目录，默认系统临时目录')
+    parser.add_argument('--json', action='store_true', help='以JSON输出结果')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    result = run(arguments)
+    if arguments.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
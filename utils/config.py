@@ -0,0 +1,190 @@
+import os
+import pickle
+import hashlib
+from typing import List, Optional, Tuple
+from utils.log import get_logger, LEVELS
+
+logger = get_logger('config')
+
+DEFAULT_DOMAIN = 'wm.wmhuu.com'
+
+# 缓存格式变化（或校验规则变化）时递增，使旧缓存失效
+CACHE_VERSION = 1
+
+
+class ConfigError(ValueError):
+    """配置文件无法解析或未通过校验"""
+
+
+def select_domain(domains: List[str]) -> Optional[str]:
+    """简化版域名选择，直接返回第一个域名"""
+    if not domains:
+        return None
+    # 简化处理，直接返回第一个域名，避免复杂的测速逻辑
+    # 由于当前环境存在代理问题，暂时不进行域名测速
+    return domains[0]
+
+
+def _file_key(path: str) -> Optional[Tuple[str, int, int]]:
+    """缓存键的一部分：(绝对路径, 修改时间, 大小)，文件不存在时为None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _load_yaml(path: str):
+    import yaml
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=loader)
+
+
+def _resolve_domain(config: dict, domain_path: str) -> str:
+    """按 site_domain.yaml 选择域名（只修改内存中的配置），返回域名来源说明"""
+    if not config.get('site_domain'):
+        config['site_domain'] = DEFAULT_DOMAIN
+    try:
+        site_config = _load_yaml(domain_path)
+    except FileNotFoundError:
+        return 'site_domain.yaml不存在，使用config.yaml中的域名'
+    except Exception as e:
+        logger.warning("读取site_domain.yaml失败: %s", e)
+        return '使用config.yaml中的域名'
+
+    if site_config and 'site_domains' in site_config:
+        domain = select_domain(site_config['site_domains'])
+        if domain:
+            config['site_domain'] = domain
+            return '使用site_domain.yaml中配置的第一个域名'
+        return '所有域名测试失败，使用默认域名'
+    if site_config and 'site_domain' in site_config:
+        # 兼容旧格式，单个域名
+        config['site_domain'] = site_config['site_domain']
+        return '从site_domain.yaml加载单个域名'
+    return '使用config.yaml中的域名'
+
+
+def validate_config(config) -> List[str]:
+    """校验配置结构和取值，返回错误列表（为空表示通过）"""
+    if not isinstance(config, dict):
+        return ['配置文件内容必须是映射']
+    errors = []
+
+    def section(name: str) -> dict:
+        value = config.get(name)
+        if not isinstance(value, dict):
+            errors.append(f'{name}: 缺少或不是映射')
+            return {}
+        return value
+
+    def number(parent: dict, prefix: str, key: str, minimum: float, integer: bool = False):
+        value = parent.get(key)
+        kinds = int if integer else (int, float)
+        if isinstance(value, bool) or not isinstance(value, kinds) or value < minimum:
+            errors.append(f'{prefix}.{key}: 必须是不小于 {minimum} 的{"整数" if integer else "数字"}，当前为 {value!r}')
+
+    def choice(parent: dict, prefix: str, key: str, options):
+        if key in parent and parent[key] not in options:
+            errors.append(f'{prefix}.{key}: 必须是 {"/".join(options)} 之一，当前为 {parent[key]!r}')
+
+    if not isinstance(config.get('site_domain'), str) or not config['site_domain']:
+        errors.append('site_domain: 必须是非空字符串')
+    choice(config, 'config', 'crawl_mode', ('picture', 'novel', 'all'))
+
+    crawl = section('crawl')
+    if crawl:
+        number(crawl, 'crawl', 'max_pages', 1, integer=True)
+        number(crawl, 'crawl', 'retry_times', 0, integer=True)
+
+    request = section('request')
+    if request:
+        if not isinstance(request.get('headers'), dict):
+            errors.append('request.headers: 必须是映射')
+        number(request, 'request', 'timeout', 0)
+        number(request, 'request', 'delay', 0)
+        if request.get('proxies') is not None and not isinstance(request['proxies'], dict):
+            errors.append('request.proxies: 必须是映射或null')
+
+    save_paths = section('save_paths')
+    for mode in ('picture', 'novel'):
+        if save_paths and not isinstance(save_paths.get(mode), str):
+            errors.append(f'save_paths.{mode}: 必须是目录路径')
+        forums = config.get(f'{mode}_forums')
+        if not isinstance(forums, list):
+            errors.append(f'{mode}_forums: 必须是列表')
+            continue
+        for i, forum in enumerate(forums):
+            if not isinstance(forum, dict) or 'id' not in forum or 'name' not in forum:
+                errors.append(f'{mode}_forums[{i}]: 必须包含 id 和 name')
+
+    # 可选配置段只校验枚举取值
+    optional = (
+        ('logging', 'level', tuple(LEVELS)),
+        ('logging', 'file_level', tuple(LEVELS)),
+        ('discovery', 'mode', ('listing', 'delta', 'auto')),
+        ('save_layout', 'mode', ('flat', 'sharded')),
+        ('storage', 'fsync', ('none', 'batch', 'always'))
+    )
+    for name, key, options in optional:
+        value = config.get(name)
+        if value is None:
+            continue
+        if not isinstance(value, dict):
+            errors.append(f'{name}: 必须是映射')
+        elif value.get(key) is not None:
+            choice(value, name, key, options)
+    return errors
+
+
+def _cache_path(cache_dir: str, config_path: str, domain_path: str) -> str:
+    name = hashlib.sha1(f'{os.path.abspath(config_path)}\0{os.path.abspath(domain_path)}'.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, f'config-{name}.pickle')
+
+
+def load_config(config_path: str = 'config.yaml', domain_path: str = 'site_domain.yaml',
+                cache_dir: Optional[str] = None) -> dict:
+    """加载并校验配置，从site_domain.yaml选择域名；不修改配置文件
+
+    校验后的配置按 (配置文件, site_domain.yaml) 的路径、修改时间和大小缓存为pickle，
+    两个文件都未改动时直接读取缓存，跳过YAML解析和校验。cache_dir 默认为配置文件所在目录下的 .cache/，
+    无法写入缓存时不影响加载。配置无法解析或未通过校验时抛出 ConfigError
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(config_path)), '.cache')
+    key = (CACHE_VERSION, _file_key(config_path), _file_key(domain_path))
+    cache_path = _cache_path(cache_dir, config_path, domain_path)
+
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached['key'] == key:
+            logger.summary("%s: %s", cached['source'], cached['config']['site_domain'])
+            return cached['config']
+    except Exception:
+        # 缓存不存在、已损坏或格式不兼容时重新解析
+        pass
+
+    if key[1] is None:
+        raise ConfigError(f'配置文件不存在: {config_path}')
+    try:
+        config = _load_yaml(config_path)
+    except Exception as e:
+        raise ConfigError(f'解析配置文件失败 {config_path}: {e}')
+    if isinstance(config, dict):
+        source = _resolve_domain(config, domain_path)
+    errors = validate_config(config)
+    if errors:
+        raise ConfigError(f'配置文件 {config_path} 校验失败：\n  ' + '\n  '.join(errors))
+    logger.summary("%s: %s", source, config['site_domain'])
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'key': key, 'source': source, 'config': config}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.request("写入配置缓存失败: %s", e)
+    return config
@@ -0,0 +1,460 @@
+import re
+import time
+import asyncio
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from utils.request import RequestHandler
+from utils.parser import HtmlParser, site_url
+from utils.shard import ShardSpec
+from utils.log import get_logger
+
+logger = get_logger('crawler')
+
+# 进度回调：callback(事件名, 事件信息)
+ProgressHook = Callable[[str, Dict[str, Any]], None]
+
+
+def topic_sort_key(topic: dict) -> int:
+    """帖子排序键：帖子ID，无ID时为0"""
+    match = re.search(r'/viewtopic/(\d+)', topic['url'])
+    return int(match.group(1)) if match else 0
+
+
+def fetch_topic_content(request_handler, parser, topic_url, topic_html, mode, site_domain, max_pages=50, workers=4,
+                        first_page=None):
+    """解析帖子内容，发现其余分页后并发获取，按页序拼接完整内容
+
+    first_page 为 parse_topic_first_page 已解析的第一页结果，提供时不再解析 topic_html
+    """
+    if first_page is None:
+        first_page = parser.parse_topic_first_page(topic_url, topic_html, mode, site_domain=site_domain,
+                                                   max_pages=max_pages)
+    first_content, page_urls = first_page['content'], first_page['page_urls']
+    if not page_urls:
+        return first_content
+
+    logger.topic("帖子共 %s 页，并发获取其余分页", len(page_urls) + 1)
+
+    def fetch_page(url):
+        page_html = request_handler.get(url)
+        if not page_html:
+            logger.warning("获取帖子分页失败：%s", url)
+            return None
+        return parser.parse_topic_page(page_html, mode, site_domain=site_domain)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        # map保持提交顺序，拼接结果与页序一致
+        page_contents = list(executor.map(fetch_page, page_urls))
+
+    contents = [first_content] + [content for content in page_contents if content]
+    return parser.merge_topic_contents(contents)
+
+
+class TopicResult:
+    """一个帖子的采集结果
+
+    - content: 解析出的内容，图片模式为 {'images': [...]}，小说模式为 {'content': '...'}；获取帖子失败时为None
+    - saved: 保存到存储端的内容数量（图片张数，小说为0或1）；没有配置存储端时为0
+    """
+
+    def __init__(self, url: str, title: str, mode: str, forum_id=None, content: Optional[Dict[str, Any]] = None,
+                 saved: int = 0, elapsed: float = 0.0):
+        self.url = url
+        self.title = title
+        self.mode = mode
+        self.forum_id = forum_id
+        self.content = content
+        self.saved = saved
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.content is not None
+
+    def __repr__(self) -> str:
+        return f'TopicResult({self.mode}, {self.url}, saved={self.saved})'
+
+
+class Crawler:
+    """可嵌入的采集器：按版块翻页或按帖子ID增量发现帖子，逐个获取、解析并交给存储端，按完成顺序产出 TopicResult
+
+    - 同步迭代：for result in crawler.crawl(['picture'])，惰性执行，消费方不取下一个结果时不会继续采集
+    - 异步迭代：async for result in crawler.acrawl(['novel'])，采集在后台线程中进行，最多缓存 max_pending 个结果
+    - 自定义并发：用 discover() 只发现帖子，再由调用方调度 process_topic()（异步为 aprocess_topic()）
+    - sink: 存储端，需提供 ContentSaver 的 save_pictures/save_novel 接口；为None时只产出解析结果，不保存
+    - progress_hooks: 进度回调，事件有 forum（开始版块）、page（解析完版块页）、topic（完成帖子）、mode（完成模式）
+
+    request_handler 和 parser 未指定时按配置创建
+    """
+
+    def __init__(self, config: dict, request_handler: Optional[RequestHandler] = None,
+                 parser: Optional[HtmlParser] = None, sink=None, daily: bool = False,
+                 shard: Optional[ShardSpec] = None, deadline=None, discovery=None, image_filter=None,
+                 progress_hooks: Optional[List[ProgressHook]] = None):
+        self.config = config
+        self.request_handler = request_handler or RequestHandler(
+            headers=config['request']['headers'],
+            timeout=config['request']['timeout'],
+            delay=config['request']['delay'],
+            retry_times=config['crawl']['retry_times'],
+            proxies=config['request'].get('proxies'),
+            max_body_size=config['request'].get('max_body_size', 5 * 1024 * 1024),
+            max_file_size=config['request'].get('max_file_size', 50 * 1024 * 1024)
+        )
+        self.parser = parser or HtmlParser()
+        self.sink = sink
+        self.daily = daily
+        self.shard = shard or ShardSpec()
+        self.deadline = deadline
+        # 帖子ID发现状态（TopicDiscovery），翻页时记录见过的帖子，按ID增量发现时必须提供
+        self.discovery = discovery
+        self.image_filter = image_filter
+        self.progress_hooks = list(progress_hooks or [])
+        # 模式 -> {'topics': 处理帖子数, 'saved': 保存内容数}
+        self.stats: Dict[str, Dict[str, int]] = {}
+        # aprocess_topic 可能被并发调用，统计和发现状态的更新需加锁
+        self._stats_lock = threading.Lock()
+        # 当日帖子按标题中的 [MM-DD] 判断
+        self.current_date = datetime.now().strftime('%m-%d')
+        self._stop_event = threading.Event()
+
+    @property
+    def site_domain(self) -> str:
+        return self.config['site_domain']
+
+    def add_progress_hook(self, hook: ProgressHook):
+        self.progress_hooks.append(hook)
+
+    def stop(self):
+        """请求停止：正在处理的帖子完成后不再发现和处理新帖子"""
+        self._stop_event.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set() or bool(self.deadline and self.deadline.stopped)
+
+    def _emit(self, event: str, **info):
+        for hook in self.progress_hooks:
+            try:
+                hook(event, info)
+            except Exception as e:
+                logger.warning("进度回调失败 %s: %s", event, e)
+
+    def is_today_post(self, title: str) -> bool:
+        """判断帖子标题是否为当日发布"""
+        # 匹配标题中的日期格式：[MM-DD]
+        match = re.search(r'\[(\d{2}-\d{2})\]', title)
+        if match:
+            return match.group(1) == self.current_date
+        return False
+
+    def iter_forum_topics(self, mode: str) -> Iterator[dict]:
+        """翻页遍历模式下各版块，产出待处理的帖子 {'title', 'url', 'mode', 'forum_id', 'stage'}"""
+        forums = self.config['picture_forums'] if mode == 'picture' else self.config['novel_forums']
+        deadline = self.deadline
+
+        for forum in forums:
+            forum_id = forum['id']
+            forum_name = forum['name']
+            if not self.shard.owns_forum(forum_id):
+                continue
+            if self.stopped:
+                break
+            logger.summary("=== 开始爬取版块：%s (ID: %s) ===", forum_name, forum_id)
+            self._emit('forum', mode=mode, forum_id=forum_id, name=forum_name)
+
+            site_domain = self.site_domain
+            forum_url = f'{site_url(site_domain)}/viewforum/{forum_id}'
+            current_page = 1
+
+            # 遍历版块的所有页面
+            while current_page <= self.config['crawl']['max_pages']:
+                if self._stop_event.is_set() or (deadline and not deadline.can_start('listing')):
+                    break
+                logger.topic("--- 第 %s 页 ---", current_page)
+
+                start_time = time.monotonic()
+                page_html = self.request_handler.get(forum_url)
+                if deadline:
+                    deadline.record('listing', time.monotonic() - start_time)
+                if not page_html:
+                    logger.warning("获取页面失败：%s", forum_url)
+                    break
+
+                topics = self.parser.parse_forum_page(page_html, site_domain=site_domain)
+                if not topics:
+                    logger.topic("未找到帖子：%s", forum_url)
+                    break
+
+                # 过滤当日帖子（如果是daily模式）
+                found = len(topics)
+                if self.daily:
+                    topics = [topic for topic in topics if self.is_today_post(topic['title'])]
+                    logger.topic("找到 %s 个帖子，其中当日帖子 %s 个", found, len(topics))
+                    if not topics:
+                        logger.topic("本页没有当日帖子，继续下一页")
+                        break
+                else:
+                    logger.topic("找到 %s 个帖子", found)
+
+                # 只处理属于本分片的帖子
+                if self.shard.enabled:
+                    topics = [topic for topic in topics if self.shard.owns_topic(topic['url'])]
+                    logger.topic("分片 %s 处理其中 %s 个帖子", self.shard, len(topics))
+
+                # 有时间预算时优先处理最新的帖子（帖子ID越大越新）
+                if deadline:
+                    topics.sort(key=topic_sort_key, reverse=True)
+                self._emit('page', mode=mode, forum_id=forum_id, page=current_page, found=found, topics=len(topics))
+
+                for topic in topics:
+                    if self.stopped:
+                        break
+                    yield {'title': topic['title'], 'url': topic['url'], 'mode': mode,
+                           'forum_id': forum_id, 'stage': f'{mode}_topic'}
+
+                if self.stopped:
+                    break
+
+                # 检查是否有下一页
+                next_url = None
+                if self.parser.has_next_page(page_html):
+                    next_url = self.parser.get_next_page_url(forum_url, page_html, site_domain=site_domain)
+                if not next_url:
+                    break
+                forum_url = next_url
+                current_page += 1
+
+    def iter_delta_topics(self, modes: List[str]) -> Iterator[dict]:
+        """按帖子ID探测新帖子，产出属于给定模式版块的帖子，附带已解析的第一页 'first_page'"""
+        if not self.discovery:
+            raise ValueError('按帖子ID增量发现需要提供 discovery')
+        site_domain = self.site_domain
+        forum_modes = {}
+        for mode in modes:
+            for forum in self.config[f'{mode}_forums']:
+                if self.shard.owns_forum(forum['id']):
+                    forum_modes[forum['id']] = mode
+
+        def select_mode(meta: dict) -> Optional[str]:
+            mode = forum_modes.get(meta['forum_id'])
+            if mode and self.daily and not self.is_today_post(meta['title']):
+                return None
+            return mode
+
+        # 按ID升序处理；产出的帖子在处理完成后才记录（见 process_topic），中途停止时已记录的最大ID之前的帖子都已处理
+        for topic_url in self.discovery.probe_new_topics(f'{site_url(site_domain)}/viewtopic/{{id}}'):
+            if not self.shard.owns_topic(topic_url):
+                self.discovery.record(topic_url)
+                continue
+            if self._stop_event.is_set() or (self.deadline and not self.deadline.can_start('delta_topic')):
+                break
+            start_time = time.monotonic()
+            topic_html = self.request_handler.get(topic_url)
+            if not topic_html:
+                logger.warning("获取帖子详情失败：%s", topic_url)
+                # 记为待重试，之后的帖子推高 max_topic_id 后下次仍会重新获取
+                self.discovery.mark_failed(topic_url)
+                continue
+
+            # 所属版块、分页和内容在同一棵解析树上提取，不属于本次采集的帖子只解析标题和版块
+            first_page = self.parser.parse_topic_first_page(
+                topic_url, topic_html, select_mode, site_domain=site_domain,
+                max_pages=self.config['crawl'].get('max_topic_pages', 50)
+            )
+            meta, mode = first_page['meta'], first_page['mode']
+            if meta['forum_id'] is None:
+                # 无法判断所属版块（页面结构不符或站点对不存在的帖子返回200），不记录，避免推高 max_topic_id
+                logger.warning("无法判断帖子所属版块，跳过：%s", topic_url)
+                continue
+            if mode is None:
+                if meta['forum_id'] not in forum_modes:
+                    logger.topic("帖子不属于本次采集的版块，跳过：%s", topic_url)
+                self.discovery.record(topic_url, meta['forum_id'])
+                continue
+
+            yield {'title': meta['title'] or topic_url.rstrip('/').split('/')[-1], 'url': topic_url, 'mode': mode,
+                   'forum_id': meta['forum_id'], 'stage': 'delta_topic', 'first_page': first_page,
+                   'fetch_time': time.monotonic() - start_time}
+
+    def discover(self, modes: Optional[List[str]] = None, delta: bool = False) -> Iterator[dict]:
+        """只发现帖子不处理，供调用方自行调度 process_topic"""
+        modes = modes or self._default_modes()
+        if delta:
+            yield from self.iter_delta_topics(modes)
+            return
+        for mode in modes:
+            yield from self.iter_forum_topics(mode)
+
+    def process_topic(self, topic: dict) -> TopicResult:
+        """获取并解析单个帖子（含所有分页），交给存储端保存，返回采集结果"""
+        mode = topic['mode']
+        start_time = time.monotonic()
+        result = TopicResult(topic['url'], topic['title'], mode, forum_id=topic.get('forum_id'))
+        logger.topic("处理帖子：%s", topic['title'])
+
+        # 按ID发现的帖子已附带解析好的第一页
+        first_page = topic.get('first_page')
+        topic_html = None
+        if first_page is None:
+            topic_html = topic.get('html') or self.request_handler.get(topic['url'])
+            if not topic_html:
+                logger.warning("获取帖子详情失败：%s", topic['url'])
+                return self._finish(result, start_time, topic)
+
+        # 解析帖子内容（包括帖子的所有分页）
+        content = fetch_topic_content(
+            self.request_handler, self.parser, topic['url'], topic_html, mode, self.site_domain,
+            max_pages=self.config['crawl'].get('max_topic_pages', 50),
+            workers=self.config['crawl'].get('topic_page_workers', 4),
+            first_page=first_page
+        )
+        if mode == 'picture' and self.image_filter and content['images']:
+            content['images'] = self.image_filter.filter(content['images'])
+        result.content = content
+        if self.sink is not None:
+            result.saved = self._save(topic, content)
+        return self._finish(result, start_time, topic)
+
+    def _save(self, topic: dict, content: Dict[str, Any]) -> int:
+        if topic['mode'] == 'picture':
+            if not content['images']:
+                logger.topic("帖子 %s 没有找到图片", topic['title'])
+                return 0
+            saved_count = self.sink.save_pictures(
+                topic['title'], content['images'], self.request_handler, topic_url=topic['url'],
+                should_stop=self.deadline.expired if self.deadline else None
+            )
+            logger.topic("帖子 %s 保存了 %s 张图片", topic['title'], saved_count)
+            return saved_count
+
+        if not content['content']:
+            logger.topic("帖子 %s 没有找到小说内容", topic['title'])
+            return 0
+        if self.sink.save_novel(topic['title'], content['content'], topic_url=topic['url']):
+            logger.topic("小说 %s 保存成功", topic['title'])
+            return 1
+        logger.error("小说 %s 保存失败", topic['title'])
+        return 0
+
+    def _finish(self, result: TopicResult, start_time: float, topic: dict) -> TopicResult:
+        result.elapsed = time.monotonic() - start_time
+        with self._stats_lock:
+            stats = self.stats.setdefault(result.mode, {'topics': 0, 'saved': 0})
+            stats['topics'] += 1
+            stats['saved'] += result.saved
+            # 帖子处理完才记录并推进 max_topic_id，中途停止时未处理的帖子下次仍会探测到
+            if self.discovery:
+                self.discovery.record(topic['url'], topic.get('forum_id'))
+        self._emit('topic', result=result)
+        return result
+
+    def _process_all(self, topics: Iterator[dict]) -> Iterator[TopicResult]:
+        """逐个处理发现的帖子，有时间预算时按阶段耗时判断能否开始下一个"""
+        for topic in topics:
+            stage = topic['stage']
+            if self._stop_event.is_set():
+                break
+            # 增量发现的帖子在获取详情前已检查过时间预算，这里不再重复判断，避免获取后丢弃
+            if stage != 'delta_topic' and self.deadline and not self.deadline.can_start(stage):
+                break
+            result = self.process_topic(topic)
+            if self.deadline:
+                self.deadline.record(stage, result.elapsed + topic.get('fetch_time', 0.0))
+            yield result
+
+    def _default_modes(self) -> List[str]:
+        crawl_mode = self.config.get('crawl_mode', 'all')
+        if crawl_mode != 'all':
+            return [crawl_mode]
+        # 先爬取图片模式，再爬取小说模式；有时间预算时先爬取代价低的小说
+        return ['novel', 'picture'] if self.deadline else ['picture', 'novel']
+
+    def crawl(self, modes: Optional[List[str]] = None, delta: bool = False) -> Iterator[TopicResult]:
+        """同步迭代采集结果；modes 默认按配置的 crawl_mode，delta 为True时按帖子ID增量发现"""
+        # 清除上次 stop()（如 acrawl 提前结束）留下的停止请求
+        self._stop_event.clear()
+        modes = modes or self._default_modes()
+        suffix = '，仅采集当日数据' if self.daily else ''
+        if delta:
+            logger.summary("===== 按帖子ID增量采集 %s%s =====", '/'.join(modes), suffix)
+            before = self.totals()
+            yield from self._process_all(self.iter_delta_topics(modes))
+            after = self.totals()
+            logger.summary("===== 增量采集完成 =====")
+            logger.summary("处理帖子：%s 个，保存内容：%s 项", after[0] - before[0], after[1] - before[1])
+            self._emit('mode', mode='delta', topics=after[0] - before[0], saved=after[1] - before[1])
+            return
+
+        for mode in modes:
+            logger.summary("===== 开始采集 %s 模式%s =====", mode, suffix)
+            logger.summary("当前日期：%s", self.current_date)
+            with self._stats_lock:
+                stats = self.stats.setdefault(mode, {'topics': 0, 'saved': 0})
+                before = dict(stats)
+            yield from self._process_all(self.iter_forum_topics(mode))
+            topics, saved = stats['topics'] - before['topics'], stats['saved'] - before['saved']
+            logger.summary("===== %s 模式采集完成 =====", mode)
+            logger.summary("%s 模式处理帖子：%s 个", mode, topics)
+            logger.summary("%s 模式保存内容：%s 项", mode, saved)
+            self._emit('mode', mode=mode, topics=topics, saved=saved)
+
+    def __iter__(self) -> Iterator[TopicResult]:
+        return self.crawl()
+
+    def totals(self):
+        """(处理帖子数, 保存内容数)"""
+        with self._stats_lock:
+            return (sum(stats['topics'] for stats in self.stats.values()),
+                    sum(stats['saved'] for stats in self.stats.values()))
+
+    async def acrawl(self, modes: Optional[List[str]] = None, delta: bool = False,
+                     max_pending: int = 1) -> AsyncIterator[TopicResult]:
+        """异步迭代采集结果：采集在后台线程中进行，已完成未取走的结果达到 max_pending 个时暂停采集
+
+        提前结束迭代（break 或取消）时请求停止，正在处理的帖子完成后后台线程退出
+        """
+        loop = asyncio.get_running_loop()
+        results: asyncio.Queue = asyncio.Queue()
+        slots = threading.Semaphore(max(1, max_pending))
+        done = object()
+
+        def produce():
+            try:
+                for result in self.crawl(modes, delta=delta):
+                    # 等待消费方取走结果，停止时放弃等待
+                    while not slots.acquire(timeout=0.1):
+                        if self._stop_event.is_set():
+                            return
+                    loop.call_soon_threadsafe(results.put_nowait, result)
+            except BaseException as e:
+                loop.call_soon_threadsafe(results.put_nowait, e)
+            finally:
+                loop.call_soon_threadsafe(results.put_nowait, done)
+
+        self._stop_event.clear()
+        producer = threading.Thread(target=produce, name='crawler', daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            if producer.is_alive():
+                self.stop()
+                await loop.run_in_executor(None, producer.join)
+
+    def __aiter__(self) -> AsyncIterator[TopicResult]:
+        return self.acrawl()
+
+    async def aprocess_topic(self, topic: dict) -> TopicResult:
+        """在线程池中处理单个帖子，供调用方用自己的并发控制调度"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.process_topic, topic)
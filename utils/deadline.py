@@ -0,0 +1,77 @@
+import time
+import threading
+from typing import Dict, Optional
+from utils.log import get_logger
+
+logger = get_logger('deadline')
+
+
+class CrawlDeadline:
+    """时间预算：跟踪已用时间和各阶段耗时，预留收尾时间，在预计来不及完成时停止接收新任务
+
+    阶段耗时用指数移动平均估算，未有样本的阶段按 default_estimate 估算
+    """
+
+    def __init__(self, budget: float, reserve: float = 300.0, default_estimate: float = 10.0, smoothing: float = 0.3):
+        self.budget = budget
+        self.reserve = reserve
+        self.default_estimate = default_estimate
+        self.smoothing = smoothing
+        self.start_time = time.monotonic()
+        self.stopped = False
+        self._lock = threading.Lock()
+        # 阶段 -> {'count', 'total', 'estimate'}
+        self._stages: Dict[str, dict] = {}
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.start_time
+
+    def remaining(self) -> float:
+        """扣除收尾预留后剩余可用于采集的时间"""
+        return self.budget - self.reserve - self.elapsed()
+
+    def expired(self) -> bool:
+        """采集时间（扣除收尾预留）是否已用完"""
+        return self.remaining() <= 0
+
+    def estimate(self, stage: str) -> float:
+        with self._lock:
+            info = self._stages.get(stage)
+            return info['estimate'] if info else self.default_estimate
+
+    def can_start(self, stage: str) -> bool:
+        """预计剩余时间是否足够完成一个该阶段的任务，不足时标记停止"""
+        if self.stopped:
+            return False
+        if self.remaining() < self.estimate(stage):
+            self.stopped = True
+            logger.summary("时间预算即将用完（已用 %.0f 秒，预留 %.0f 秒收尾），停止接收新任务", self.elapsed(), self.reserve)
+        return not self.stopped
+
+    def record(self, stage: str, seconds: float):
+        """记录一个任务的耗时"""
+        with self._lock:
+            info = self._stages.setdefault(stage, {'count': 0, 'total': 0.0, 'estimate': seconds})
+            info['count'] += 1
+            info['total'] += seconds
+            info['estimate'] = self.smoothing * seconds + (1 - self.smoothing) * info['estimate']
+
+    def summary(self) -> str:
+        """各阶段吞吐量摘要"""
+        lines = [f"时间预算 {self.budget:.0f} 秒，已用 {self.elapsed():.0f} 秒{'（提前停止）' if self.stopped else ''}"]
+        with self._lock:
+            for stage, info in self._stages.items():
+                rate = info['count'] / info['total'] * 60 if info['total'] else 0
+                lines.append(f"  {stage}: {info['count']} 个，平均 {info['total'] / info['count']:.1f} 秒，{rate:.1f} 个/分钟")
+        return '\n'.join(lines)
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """解析时长参数：纯数字为秒，支持 s/m/h 后缀，如 '90m'、'5.5h'"""
+    if not value:
+        return None
+    value = value.strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
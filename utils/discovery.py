@@ -0,0 +1,132 @@
+import os
+import re
+import json
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from utils.log import get_logger
+
+logger = get_logger('discovery')
+
+_TOPIC_ID_RE = re.compile(r'/viewtopic/(\d+)')
+
+
+def topic_id_of(url: str) -> Optional[int]:
+    """从帖子URL中提取帖子ID"""
+    match = _TOPIC_ID_RE.search(url)
+    return int(match.group(1)) if match else None
+
+
+class TopicDiscovery:
+    """按帖子ID增量发现新帖子
+
+    记录每个版块见过的最大帖子ID，之后直接探测更大的ID是否存在，
+    而不是翻页遍历版块列表；列表翻页只在定期对账（reconcile_days）时使用
+
+    状态文件：{'forums': {版块ID: 最大帖子ID}, 'max_topic_id': 全局最大ID, 'last_reconcile': ISO时间,
+              'retry_topic_ids': [待重试的帖子ID]}
+
+    探测出错或获取详情失败的帖子ID记入 retry_topic_ids，之后的探测优先重新尝试，
+    避免之后的帖子推高 max_topic_id 后这些帖子再也不被采集；成功 record() 后移出
+    """
+
+    def __init__(self, state_path: str, request_handler=None, concurrency: int = 8, max_gap: int = 20,
+                 max_probe: int = 1000, reconcile_days: float = 7, seed_path: Optional[str] = None):
+        self.state_path = state_path
+        self.request_handler = request_handler
+        self.concurrency = max(1, concurrency)
+        self.max_gap = max_gap
+        self.max_probe = max_probe
+        self.reconcile_days = reconcile_days
+        self.state = {'forums': {}, 'max_topic_id': 0, 'last_reconcile': None, 'retry_topic_ids': []}
+        # 状态文件不存在时从seed_path读取初始状态（分片输出到独立目录时使用仓库中的状态）
+        for path in (state_path, seed_path):
+            if path and os.path.exists(path):
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.state.update(json.load(f))
+                break
+
+    def needs_reconcile(self) -> bool:
+        """是否需要用列表翻页对账：没有记录或距上次对账超过reconcile_days"""
+        if not self.state['max_topic_id'] or not self.state['last_reconcile']:
+            return True
+        last = datetime.fromisoformat(self.state['last_reconcile'])
+        return datetime.now() - last >= timedelta(days=self.reconcile_days)
+
+    def mark_reconciled(self):
+        self.state['last_reconcile'] = datetime.now().isoformat(timespec='seconds')
+
+    def record(self, topic_url: str, forum_id=None):
+        """记录见过的帖子，更新版块和全局的最大帖子ID"""
+        topic_id = topic_id_of(topic_url)
+        if topic_id is None:
+            return
+        if forum_id is not None:
+            key = str(forum_id)
+            self.state['forums'][key] = max(self.state['forums'].get(key, 0), topic_id)
+        self.state['max_topic_id'] = max(self.state['max_topic_id'], topic_id)
+        if topic_id in self.state['retry_topic_ids']:
+            self.state['retry_topic_ids'].remove(topic_id)
+
+    def mark_failed(self, topic_url: str):
+        """记录获取失败的帖子，下次探测时重新尝试"""
+        topic_id = topic_id_of(topic_url)
+        if topic_id is not None and topic_id not in self.state['retry_topic_ids']:
+            self.state['retry_topic_ids'].append(topic_id)
+            self.state['retry_topic_ids'].sort()
+
+    def merge_state(self, other: dict):
+        """合并另一份状态（如各分片的状态），取各版块最大ID和最近的对账时间"""
+        for key, topic_id in other.get('forums', {}).items():
+            self.state['forums'][key] = max(self.state['forums'].get(key, 0), topic_id)
+        self.state['max_topic_id'] = max(self.state['max_topic_id'], other.get('max_topic_id', 0))
+        # 分片按帖子ID划分，各分片只保留自己负责的待重试ID，取并集即可
+        self.state['retry_topic_ids'] = sorted(set(self.state['retry_topic_ids']) | set(other.get('retry_topic_ids', [])))
+        reconciled = [t for t in (self.state['last_reconcile'], other.get('last_reconcile')) if t]
+        self.state['last_reconcile'] = max(reconciled) if reconciled else None
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.state_path)
+
+    def probe_new_topics(self, url_template: str) -> List[str]:
+        """从全局最大ID之后逐批并发探测帖子是否存在，连续max_gap个ID不存在时停止
+
+        先重新探测 retry_topic_ids 中的帖子：已不存在的移出，仍然出错的保留；
+        探测出错（网络错误）的ID计入间隔并记为待重试。
+        url_template 形如 'https://域名/viewtopic/{id}'，返回存在的帖子URL（按ID升序）
+        """
+        start_id = self.state['max_topic_id'] + 1
+        found = []
+        gap = 0
+        next_id = start_id
+        logger.topic("从帖子ID %d 开始探测新帖子", start_id)
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            # 不小于 start_id 的待重试ID会在下面的顺序探测中覆盖
+            retry_ids = [topic_id for topic_id in self.state['retry_topic_ids'] if topic_id < start_id]
+            if retry_ids:
+                logger.topic("重新探测 %d 个之前失败的帖子", len(retry_ids))
+                urls = [url_template.format(id=topic_id) for topic_id in retry_ids]
+                for topic_id, url, exists in zip(retry_ids, urls, executor.map(self.request_handler.exists, urls)):
+                    if exists:
+                        found.append(url)
+                    elif exists is False:
+                        self.state['retry_topic_ids'].remove(topic_id)
+
+            while gap < self.max_gap and next_id - start_id < self.max_probe:
+                batch = list(range(next_id, min(next_id + self.concurrency, start_id + self.max_probe)))
+                next_id = batch[-1] + 1
+                urls = [url_template.format(id=topic_id) for topic_id in batch]
+                for url, exists in zip(urls, executor.map(self.request_handler.exists, urls)):
+                    if exists:
+                        found.append(url)
+                        gap = 0
+                    else:
+                        if exists is None:
+                            self.mark_failed(url)
+                        gap += 1
+        logger.summary("探测了 %d 个帖子ID，发现 %d 个新帖子", next_id - start_id + len(retry_ids), len(found))
+        return found
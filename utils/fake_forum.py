@@ -0,0 +1,419 @@
+import re
+import json
+import time
+import random
+import struct
+import sys
+import argparse
+import threading
+import http.client
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+_FORUM_RE = re.compile(r'^/viewforum/(\d+)$')
+_TOPIC_RE = re.compile(r'^/viewtopic/(\d+)$')
+_IMAGE_RE = re.compile(r'^/images/(\d+)_(\d+)_(\d+)\.png$')
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+class _QuietServer(ThreadingHTTPServer):
+    """客户端提前断开（如Range探测只读取头部后关闭连接）时不打印异常"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+_PARAGRAPH = '这是用于本地压测的段落文本，内容由测试服务器按帖子编号生成，长度足以通过正文提取的最小长度判断。'
+
+
+class FakeForum:
+    """本地模拟论坛服务器：按确定的规则生成版块列表页、帖子页（含分页）和图片，用于离线压测完整的采集流程
+
+    页面结构与 HtmlParser 支持的 phpBB 风格一致：
+    - /viewforum/{版块ID}?page=N：帖子列表，rel="next" 指向下一页
+    - /viewtopic/{帖子ID}?page=N：帖子分页，含面包屑、标题和正文（小说段落或图片）
+    - /images/{帖子ID}_{页}_{序号}.png：带合法PNG头的图片，支持Range请求
+
+    故障注入（按 seed 确定性随机）：
+    - latency/jitter：每个响应的固定延迟和随机抖动（秒）
+    - bandwidth：每个响应的传输速率上限（字节/秒，0为不限）
+    - error_rate：返回500的比例；throttle_rate：返回429（带Retry-After）的比例
+    - slowloris_rate：先发送响应头，再以极慢的速度发送正文的比例
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, novel_forums: int = 2, picture_forums: int = 2,
+                 topics_per_forum: int = 50, topics_per_page: int = 20, pages_per_topic: int = 2,
+                 paragraphs_per_page: int = 20, images_per_page: int = 5, image_bytes: int = 50 * 1024,
+                 latency: float = 0.0, jitter: float = 0.0, bandwidth: int = 0,
+                 error_rate: float = 0.0, throttle_rate: float = 0.0, slowloris_rate: float = 0.0,
+                 slowloris_seconds: float = 15.0, retry_after: int = 1, seed: int = 0):
+        self.topics_per_forum = topics_per_forum
+        self.topics_per_page = max(1, topics_per_page)
+        self.pages_per_topic = max(1, pages_per_topic)
+        self.paragraphs_per_page = paragraphs_per_page
+        self.images_per_page = images_per_page
+        self.image_bytes = image_bytes
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.slowloris_rate = slowloris_rate
+        self.slowloris_seconds = slowloris_seconds
+        self.retry_after = retry_after
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.title_date = datetime.now().strftime('%m-%d')
+
+        # 版块ID -> 模式；帖子ID按版块交错分配，模拟全站递增的帖子ID
+        self.forums: Dict[int, str] = {}
+        for i in range(novel_forums):
+            self.forums[100 + i] = 'novel'
+        for i in range(picture_forums):
+            self.forums[200 + i] = 'picture'
+        forum_ids = list(self.forums)
+        self.topic_forum: Dict[int, int] = {}
+        self.forum_topics: Dict[int, List[int]] = {forum_id: [] for forum_id in forum_ids}
+        for n in range(topics_per_forum * len(forum_ids)):
+            topic_id = 1000 + n
+            forum_id = forum_ids[n % len(forum_ids)]
+            self.topic_forum[topic_id] = forum_id
+            self.forum_topics[forum_id].append(topic_id)
+
+        self._stats = {'requests': 0, 'bytes': 0, 'status': {}, 'kinds': {}, 'latencies': []}
+        self._server = _QuietServer((host, port), self._make_handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeForum':
+        """在后台线程中启动服务器"""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def forum_config(self) -> Dict[str, List[dict]]:
+        """生成可直接写入 config.yaml 的版块配置"""
+        config = {'novel_forums': [], 'picture_forums': []}
+        for forum_id, mode in self.forums.items():
+            config[f'{mode}_forums'].append({'id': forum_id, 'name': f'测试版块{forum_id}'})
+        return config
+
+    def stats(self) -> dict:
+        """请求统计：总数、字节数、状态码和资源类型计数、响应耗时分位数（秒）"""
+        with self._lock:
+            latencies = sorted(self._stats['latencies'])
+            result = {key: value for key, value in self._stats.items() if key != 'latencies'}
+            result = json.loads(json.dumps(result))
+        result['latency'] = {
+            'p50': _percentile(latencies, 50),
+            'p95': _percentile(latencies, 95),
+            'p99': _percentile(latencies, 99),
+            'max': latencies[-1] if latencies else 0.0
+        }
+        return result
+
+    def _record(self, kind: str, status: int, size: int, seconds: float):
+        with self._lock:
+            self._stats['requests'] += 1
+            self._stats['bytes'] += size
+            self._stats['status'][str(status)] = self._stats['status'].get(str(status), 0) + 1
+            self._stats['kinds'][kind] = self._stats['kinds'].get(kind, 0) + 1
+            self._stats['latencies'].append(seconds)
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    # ---- 页面生成 ----
+
+    def topic_title(self, topic_id: int) -> str:
+        return f'[{self.title_date}] 测试帖子 {topic_id}'
+
+    def render_forum(self, forum_id: int, page: int) -> Optional[str]:
+        topics = self.forum_topics.get(forum_id)
+        if topics is None:
+            return None
+        # 列表页按帖子ID从新到旧排列
+        topics = list(reversed(topics))
+        start = (page - 1) * self.topics_per_page
+        items = ''.join(
+            f'<li class="row"><a class="topictitle" href="/viewtopic/{topic_id}">{self.topic_title(topic_id)}</a></li>'
+            for topic_id in topics[start:start + self.topics_per_page]
+        )
+        next_link = ''
+        if start + self.topics_per_page < len(topics):
+            next_link = f'<a rel="next" href="/viewforum/{forum_id}?page={page + 1}">下一页</a>'
+        return (f'<html><head><meta charset="utf-8"><title>测试版块{forum_id}</title></head><body>'
+                f'<ul class="topics">{items}</ul><div class="pagination">{next_link}</div></body></html>')
+
+    def render_topic(self, topic_id: int, page: int) -> Optional[str]:
+        forum_id = self.topic_forum.get(topic_id)
+        if forum_id is None or not 1 <= page <= self.pages_per_topic:
+            return None
+        if self.forums[forum_id] == 'novel':
+            body = ''.join(f'<p>{topic_id}-{page}-{i} {_PARAGRAPH}</p>' for i in range(self.paragraphs_per_page))
+        else:
+            body = ''.join(f'<img src="/images/{topic_id}_{page}_{i}.png">' for i in range(self.images_per_page))
+        pages = ''.join(f'<a href="/viewtopic/{topic_id}?page={n}">{n}</a>' for n in range(1, self.pages_per_topic + 1))
+        return (f'<html><head><meta charset="utf-8"><title>{self.topic_title(topic_id)}</title></head><body>'
+                f'<div class="breadcrumb"><a href="/">首页</a><a href="/viewforum/{forum_id}">测试版块{forum_id}</a></div>'
+                f'<h2 class="topictitle">{self.topic_title(topic_id)}</h2>'
+                f'<div class="pagination">{pages}</div><div class="postbody">{body}</div></body></html>')
+
+    def render_image(self, topic_id: int, page: int, index: int) -> bytes:
+        """带合法PNG签名和IHDR的图片（尺寸640x480），其余字节按编号确定性填充"""
+        ihdr = struct.pack('>IIBBBBB', 640, 480, 8, 2, 0, 0, 0)
+        head = b'\x89PNG\r\n\x1a\n' + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr + b'\x00\x00\x00\x00'
+        seed = f'{topic_id}-{page}-{index}'.encode('utf-8')
+        padding = (seed * (self.image_bytes // len(seed) + 1))[:max(0, self.image_bytes - len(head))]
+        return head + padding
+
+    # ---- 请求处理 ----
+
+    def _make_handler(self):
+        forum = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                forum._handle(self, send_body=False)
+
+            def do_GET(self):
+                forum._handle(self, send_body=True)
+
+        return Handler
+
+    def _handle(self, handler: BaseHTTPRequestHandler, send_body: bool):
+        start_time = time.monotonic()
+        parts = urlparse(handler.path)
+        page = int(parse_qs(parts.query).get('page', ['1'])[0] or 1)
+        kind, body, content_type = 'other', None, 'text/html; charset=utf-8'
+
+        match = _FORUM_RE.match(parts.path)
+        if match:
+            kind = 'forum'
+            html = self.render_forum(int(match.group(1)), page)
+            body = html.encode('utf-8') if html is not None else None
+        match = _TOPIC_RE.match(parts.path)
+        if match:
+            kind = 'topic'
+            html = self.render_topic(int(match.group(1)), page)
+            body = html.encode('utf-8') if html is not None else None
+        match = _IMAGE_RE.match(parts.path)
+        if match:
+            kind = 'image'
+            topic_id, image_page, index = (int(value) for value in match.groups())
+            if topic_id in self.topic_forum:
+                body = self.render_image(topic_id, image_page, index)
+                content_type = 'image/png'
+
+        status, headers, slow = 200, {}, False
+        if body is None:
+            status, body = 404, b'not found'
+        else:
+            roll = self._roll()
+            if roll < self.error_rate:
+                status, body = 500, b'injected error'
+            elif roll < self.error_rate + self.throttle_rate:
+                status, body = 429, b'too many requests'
+                headers['Retry-After'] = str(self.retry_after)
+            elif roll < self.error_rate + self.throttle_rate + self.slowloris_rate:
+                slow = True
+
+        # Range请求（图片预过滤探测）
+        range_header = handler.headers.get('Range')
+        if status == 200 and range_header:
+            range_match = _RANGE_RE.match(range_header)
+            if range_match and range_match.group(1):
+                first = int(range_match.group(1))
+                last = min(int(range_match.group(2) or len(body) - 1), len(body) - 1)
+                headers['Content-Range'] = f'bytes {first}-{last}/{len(body)}'
+                status, body = 206, body[first:last + 1]
+
+        delay = self.latency + (self._roll() * self.jitter if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', content_type)
+            handler.send_header('Content-Length', str(len(body)))
+            for key, value in headers.items():
+                handler.send_header(key, value)
+            handler.end_headers()
+            if send_body:
+                self._send_body(handler, body, slow)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端超时断开（如慢速响应）
+            pass
+        self._record(kind, status, len(body) if send_body else 0, time.monotonic() - start_time)
+
+    def _send_body(self, handler: BaseHTTPRequestHandler, body: bytes, slow: bool):
+        if slow:
+            # 慢速响应：在 slowloris_seconds 内逐块发送正文
+            chunks = 20
+            step = max(1, len(body) // chunks)
+            for offset in range(0, len(body), step):
+                handler.wfile.write(body[offset:offset + step])
+                handler.wfile.flush()
+                time.sleep(self.slowloris_seconds / chunks)
+            return
+        if not self.bandwidth:
+            handler.wfile.write(body)
+            return
+        # 按带宽上限分块发送
+        chunk_size = max(1024, self.bandwidth // 10)
+        for offset in range(0, len(body), chunk_size):
+            chunk = body[offset:offset + chunk_size]
+            handler.wfile.write(chunk)
+            time.sleep(len(chunk) / self.bandwidth)
+
+
+class FakeProxy:
+    """本地模拟上游HTTP代理：转发普通HTTP请求（不支持CONNECT），可注入延迟和连接失败，用于测试代理池
+
+    down 为True时直接断开所有连接，模拟代理宕机
+    """
+
+    _FORWARD_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Retry-After')
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.down = False
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _QuietServer((host, port), self._make_handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeProxy':
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _make_handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_HEAD(self):
+                proxy._forward(self, 'HEAD')
+
+            def do_GET(self):
+                proxy._forward(self, 'GET')
+
+        return Handler
+
+    def _forward(self, handler: BaseHTTPRequestHandler, method: str):
+        with self._lock:
+            self.requests += 1
+            fail = self.down or self._random.random() < self.failure_rate
+        if fail:
+            handler.close_connection = True
+            handler.connection.close()
+            return
+        if self.latency:
+            time.sleep(self.latency)
+
+        parts = urlparse(handler.path)
+        headers = {key: value for key, value in handler.headers.items()
+                   if key.lower() not in ('proxy-connection', 'connection', 'host')}
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        try:
+            path = parts.path + (f'?{parts.query}' if parts.query else '')
+            connection.request(method, path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+            handler.send_response(response.status)
+            for key in self._FORWARD_HEADERS:
+                if response.getheader(key) is not None:
+                    handler.send_header(key, response.getheader(key))
+            handler.end_headers()
+            if method != 'HEAD':
+                handler.wfile.write(body)
+        except (OSError, http.client.HTTPException):
+            handler.close_connection = True
+        finally:
+            connection.close()
+
+
+def _percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """模拟论坛服务器的命令行参数（独立运行和压测脚本共用）"""
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址')
+    parser.add_argument('--port', type=int, default=0, help='监听端口，0为随机端口')
+    parser.add_argument('--novel-forums', type=int, default=2, help='小说版块数')
+    parser.add_argument('--picture-forums', type=int, default=2, help='图片版块数')
+    parser.add_argument('--topics-per-forum', type=int, default=50, help='每个版块的帖子数')
+    parser.add_argument('--topics-per-page', type=int, default=20, help='版块列表每页帖子数')
+    parser.add_argument('--pages-per-topic', type=int, default=2, help='每个帖子的分页数')
+    parser.add_argument('--images-per-page', type=int, default=5, help='图片帖子每页图片数')
+    parser.add_argument('--image-bytes', type=int, default=50 * 1024, help='每张图片的字节数')
+    parser.add_argument('--latency', type=float, default=0.0, help='每个响应的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='每个响应的随机延迟上限（秒）')
+    parser.add_argument('--bandwidth', type=int, default=0, help='每个响应的传输速率上限（字节/秒），0为不限')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回500的比例')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='返回429的比例')
+    parser.add_argument('--slowloris-rate', type=float, default=0.0, help='慢速发送正文的比例')
+    parser.add_argument('--slowloris-seconds', type=float, default=15.0, help='慢速响应发送正文的总时长（秒）')
+    parser.add_argument('--seed', type=int, default=0, help='故障注入的随机种子')
+
+
+def server_from_args(args: argparse.Namespace) -> FakeForum:
+    return FakeForum(
+        host=args.host, port=args.port,
+        novel_forums=args.novel_forums, picture_forums=args.picture_forums,
+        topics_per_forum=args.topics_per_forum, topics_per_page=args.topics_per_page,
+        pages_per_topic=args.pages_per_topic, images_per_page=args.images_per_page,
+        image_bytes=args.image_bytes, latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        slowloris_rate=args.slowloris_rate, slowloris_seconds=args.slowloris_seconds, seed=args.seed
+    )
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='本地模拟论坛服务器')
+    add_server_arguments(arg_parser)
+    server = server_from_args(arg_parser.parse_args()).start()
+    print(f"模拟论坛已启动：{server.url}")
+    print(f"版块配置：{json.dumps(server.forum_config(), ensure_ascii=False)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
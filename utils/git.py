@@ -7,10 +7,9 @@ Git 操作工具类
 
 import os
 import subprocess
-import logging
+from utils.log import get_logger
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger('git')
 
 
 class GitManager:
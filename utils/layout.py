@@ -0,0 +1,113 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+from utils.log import get_logger
+
+logger = get_logger('layout')
+
+# 每日模式的日期目录，迁移时作为独立容器处理
+_DAILY_DIR_RE = re.compile(r'^daily_\d{4}-\d{2}-\d{2}$')
+
+
+class SaveLayout:
+    """保存目录布局
+
+    - flat: 条目（图片帖子目录 / 小说文件）直接放在保存目录下
+    - sharded: 按名称哈希放入两级子目录，如 picture/3f/a2/<标题>/，
+      并在保存目录下维护 _layout_index.jsonl 记录 标题 -> 相对路径
+    """
+
+    INDEX_NAME = '_layout_index.jsonl'
+
+    def __init__(self, mode: str = 'flat', depth: int = 2, width: int = 2):
+        if mode not in ('flat', 'sharded'):
+            raise ValueError(f'未知的保存布局: {mode}')
+        self.mode = mode
+        self.depth = depth
+        self.width = width
+        self._lock = threading.Lock()
+        # 保存目录 -> {名称: 相对路径}
+        self._indexes: Dict[str, Dict[str, str]] = {}
+
+    @property
+    def sharded(self) -> bool:
+        return self.mode == 'sharded'
+
+    def shard_of(self, name: str) -> str:
+        """返回名称对应的分片相对目录，如 '3f/a2'"""
+        digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+        return '/'.join(digest[i * self.width:(i + 1) * self.width] for i in range(self.depth))
+
+    def path_for(self, base_dir: str, name: str) -> str:
+        """返回条目在保存目录下的完整路径，分片布局下同时登记到查找索引"""
+        if not self.sharded:
+            return os.path.join(base_dir, name)
+
+        rel_path = os.path.join(*self.shard_of(name).split('/'), name)
+        with self._lock:
+            index = self._load_index(base_dir)
+            if index.get(name) != rel_path:
+                index[name] = rel_path
+                with open(os.path.join(base_dir, self.INDEX_NAME), 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'name': name, 'path': rel_path}, ensure_ascii=False) + '\n')
+        return os.path.join(base_dir, rel_path)
+
+    def lookup(self, base_dir: str, name: str) -> Optional[str]:
+        """按名称查找条目路径，不存在返回None"""
+        if not self.sharded:
+            path = os.path.join(base_dir, name)
+            return path if os.path.exists(path) else None
+        with self._lock:
+            rel_path = self._load_index(base_dir).get(name)
+        return os.path.join(base_dir, rel_path) if rel_path else None
+
+    def _load_index(self, base_dir: str) -> Dict[str, str]:
+        if base_dir not in self._indexes:
+            index = {}
+            index_path = os.path.join(base_dir, self.INDEX_NAME)
+            if os.path.exists(index_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+                        index[entry['name']] = entry['path']
+            self._indexes[base_dir] = index
+        return self._indexes[base_dir]
+
+    def _is_shard_dir(self, name: str) -> bool:
+        return len(name) == self.width and all(c in '0123456789abcdef' for c in name)
+
+    def migrate(self, root: str) -> Dict[str, str]:
+        """把保存目录（及其下的 daily_* 目录）中的平铺条目迁移到分片布局，返回 {旧路径: 新路径}"""
+        if not self.sharded:
+            raise ValueError('只能迁移到分片布局')
+        moved = {}
+        if not os.path.isdir(root):
+            return moved
+
+        containers = [root] + [os.path.join(root, name) for name in sorted(os.listdir(root))
+                               if _DAILY_DIR_RE.match(name) and os.path.isdir(os.path.join(root, name))]
+        for container in containers:
+            count = 0
+            for name in sorted(os.listdir(container)):
+                src = os.path.join(container, name)
+                if name == self.INDEX_NAME or name.startswith('.') or _DAILY_DIR_RE.match(name):
+                    continue
+                if os.path.isdir(src) and self._is_shard_dir(name):
+                    continue
+                dst = self.path_for(container, name)
+                if os.path.exists(dst):
+                    logger.warning("目标已存在，跳过迁移: %s", src)
+                    continue
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.rename(src, dst)
+                moved[os.path.normpath(src)] = os.path.normpath(dst)
+                count += 1
+            if count:
+                logger.summary("已迁移 %d 个条目: %s", count, container)
+        return moved
@@ -0,0 +1,194 @@
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# 日志级别：summary（运行摘要）、topic（每个版块页和帖子）、request（每个请求和保存的文件）
+SUMMARY = 25
+TOPIC = logging.INFO
+REQUEST = 15
+logging.addLevelName(SUMMARY, 'SUMMARY')
+logging.addLevelName(REQUEST, 'REQUEST')
+
+LEVELS = {'summary': SUMMARY, 'topic': TOPIC, 'request': REQUEST}
+
+ROOT_NAME = 'crawler'
+
+# LogRecord 自带的属性，其余属性视为 extra 字段写入JSON日志
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class CrawlerLogger(logging.LoggerAdapter):
+    """按采集粒度分级的日志接口，级别未开启时不格式化消息"""
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+    def summary(self, msg, *args, **kwargs):
+        self.log(SUMMARY, msg, *args, **kwargs)
+
+    def topic(self, msg, *args, **kwargs):
+        self.log(TOPIC, msg, *args, **kwargs)
+
+    def request(self, msg, *args, **kwargs):
+        self.log(REQUEST, msg, *args, **kwargs)
+
+
+def get_logger(name: str) -> CrawlerLogger:
+    """获取模块日志，如 get_logger('request') -> crawler.request"""
+    return CrawlerLogger(logging.getLogger(f'{ROOT_NAME}.{name}'), {})
+
+
+class RateLimitFilter(logging.Filter):
+    """限制重复消息：同一日志、同一级别、同一消息模板在 interval 秒内最多输出 burst 条，
+    超出的被丢弃，下一条放行的消息附带省略的条数
+
+    只限制容易刷屏的 request 和 warning 级别（如每个请求的重试、大面积失败），
+    topic、summary 和 error 级别的消息全部输出
+    """
+
+    LIMITED_LEVELS = (REQUEST, logging.WARNING)
+
+    def __init__(self, burst: int = 5, interval: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._lock = threading.Lock()
+        # 键 -> [窗口开始时间, 窗口内已输出条数, 已省略条数]
+        self._windows: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno not in self.LIMITED_LEVELS or self.burst <= 0:
+            return True
+        key = (record.name, record.levelno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                suppressed = 0
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+    def pop_suppressed(self):
+        """取出各窗口中尚未报告的省略条数：[(日志名, 级别, 消息模板, 条数)]"""
+        with self._lock:
+            pending = [key + (window[2],) for key, window in self._windows.items() if window[2]]
+            for window in self._windows.values():
+                window[2] = 0
+        return pending
+
+
+class _NonFormattingQueueHandler(QueueHandler):
+    """只把日志记录放入队列，格式化留给后台线程，调用方不承担格式化和控制台I/O开销"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class ConsoleFormatter(logging.Formatter):
+    """控制台输出：保持原有的纯消息格式，警告和错误带级别前缀，附带省略的重复条数"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if record.levelno >= logging.WARNING:
+            message = f'[{record.levelname}] {message}'
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += f'（已省略 {suppressed} 条相同消息）'
+        if record.exc_text:
+            message += '\n' + record.exc_text
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON Lines 格式：时间、级别、日志名、线程、消息、消息模板和 extra 字段"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+            'template': record.msg if isinstance(record.msg, str) else str(record.msg)
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+_listener: Optional[QueueListener] = None
+_rate_limit: Optional[RateLimitFilter] = None
+
+
+def setup_logging(level: str = 'topic', log_file: Optional[str] = None, file_level: Optional[str] = None,
+                  burst: int = 5, interval: float = 60.0):
+    """配置日志：调用方只把记录放入无界队列，由后台线程写控制台和可选的JSON Lines文件
+
+    level 为控制台级别（summary/topic/request），file_level 为文件级别（默认与控制台相同）
+    """
+    global _listener, _rate_limit
+    shutdown_logging()
+
+    console_level = LEVELS[level]
+    handlers = []
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(console_level)
+    console.setFormatter(ConsoleFormatter())
+    handlers.append(console)
+    min_level = console_level
+    if log_file:
+        file_handler = logging.FileHandler(log_file, encoding='utf-8')
+        file_handler.setLevel(LEVELS[file_level or level])
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+        min_level = min(min_level, file_handler.level)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _NonFormattingQueueHandler(log_queue)
+    _rate_limit = RateLimitFilter(burst=burst, interval=interval)
+    queue_handler.addFilter(_rate_limit)
+
+    logger = logging.getLogger(ROOT_NAME)
+    logger.handlers = [queue_handler]
+    logger.setLevel(min_level)
+    logger.propagate = False
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    if _listener is not None:
+        # 报告最后一个窗口内被省略的重复消息
+        for name, level, msg, count in _rate_limit.pop_suppressed():
+            logging.getLogger(name).log(SUMMARY, '共省略 %d 条%s级别的重复消息：%s', count, logging.getLevelName(level), msg)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -0,0 +1,171 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from utils.log import get_logger
+
+logger = get_logger('manifest')
+
+
+class Manifest:
+    """保存清单：每次运行追加一个 JSONL 清单，合并后生成全局目录 catalog.jsonl
+
+    清单每行一个已保存条目：{url, topic_url, title, path, size, sha256, mode, time}
+    目录按 path 去重（以最新条目为准），下游只需读取目录而无需遍历保存目录
+    """
+
+    CATALOG_NAME = 'catalog.jsonl'
+    STATE_NAME = 'catalog.state.json'
+
+    def __init__(self, manifest_dir: str = './manifests', run_id: Optional[str] = None, suffix: str = ''):
+        self.manifest_dir = manifest_dir
+        os.makedirs(manifest_dir, exist_ok=True)
+        if not run_id:
+            run_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{suffix}"
+        self.run_id = run_id
+        self.path = os.path.join(manifest_dir, f'run_{run_id}.jsonl')
+        self._lock = threading.Lock()
+        self._file = None
+        self.count = 0
+
+    def record(self, path: str, mode: str, title: str, url: str = '', topic_url: str = '',
+               size: Optional[int] = None, sha256: Optional[str] = None, data: Optional[bytes] = None):
+        """追加一条保存记录，未提供size/sha256时根据data或文件内容计算"""
+        if data is not None:
+            size = len(data) if size is None else size
+            sha256 = sha256 or hashlib.sha256(data).hexdigest()
+        elif size is None or sha256 is None:
+            size, sha256 = self.file_digest(path)
+
+        entry = {
+            'url': url,
+            'topic_url': topic_url,
+            'title': title,
+            'path': os.path.normpath(path),
+            'size': size,
+            'sha256': sha256,
+            'mode': mode,
+            'time': datetime.now().isoformat(timespec='seconds')
+        }
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            self._file.write(line)
+            self.count += 1
+
+    def close(self):
+        """关闭本次运行的清单文件"""
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def file_digest(path: str) -> tuple:
+        """返回文件的 (大小, sha256)"""
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        return size, digest.hexdigest()
+
+    def build_catalog(self) -> int:
+        """把尚未合并的运行清单合并进全局目录，返回目录条目数"""
+        return build_catalog(self.manifest_dir)
+
+
+def read_jsonl(path: str) -> List[dict]:
+    """读取 JSONL 文件，跳过中断写入留下的不完整行"""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries
+
+
+def list_run_manifests(manifest_dir: str) -> List[str]:
+    """按时间顺序列出目录中的运行清单文件名"""
+    if not os.path.isdir(manifest_dir):
+        return []
+    return sorted(name for name in os.listdir(manifest_dir)
+                  if name.startswith('run_') and name.endswith('.jsonl'))
+
+
+def build_catalog(manifest_dir: str) -> int:
+    """增量合并运行清单到 catalog.jsonl（按 path 去重，以最新条目为准），返回目录条目数"""
+    catalog_path = os.path.join(manifest_dir, Manifest.CATALOG_NAME)
+    state_path = os.path.join(manifest_dir, Manifest.STATE_NAME)
+
+    state = {'merged': []}
+    if os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    merged = set(state.get('merged', []))
+
+    pending = [name for name in list_run_manifests(manifest_dir) if name not in merged]
+    catalog: Dict[str, dict] = {entry['path']: entry for entry in read_jsonl(catalog_path)}
+    if not pending and os.path.exists(catalog_path):
+        return len(catalog)
+
+    for name in pending:
+        for entry in read_jsonl(os.path.join(manifest_dir, name)):
+            catalog[entry['path']] = entry
+
+    tmp_path = catalog_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for path in sorted(catalog):
+            f.write(json.dumps(catalog[path], ensure_ascii=False) + '\n')
+    os.replace(tmp_path, catalog_path)
+
+    state['merged'] = sorted(merged.union(pending))
+    with open(state_path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(state_path + '.tmp', state_path)
+
+    logger.summary("目录合并完成：新增 %d 个运行清单，共 %d 条", len(pending), len(catalog))
+    return len(catalog)
+
+
+def remap_path(path: str, moved: Dict[str, str]) -> str:
+    """按迁移映射替换路径：路径本身或其任一上级目录被移动时返回新路径"""
+    path = os.path.normpath(path)
+    head, tail = path, ''
+    while head and head not in moved:
+        head, name = os.path.split(head)
+        if not name:
+            return path
+        tail = os.path.join(name, tail) if tail else name
+    if not head:
+        return path
+    return os.path.join(moved[head], tail) if tail else moved[head]
+
+
+def remap_catalog(manifest_dir: str, moved: Dict[str, str]) -> int:
+    """目录迁移后更新全局目录中的路径，返回更新条数"""
+    catalog_path = os.path.join(manifest_dir, Manifest.CATALOG_NAME)
+    entries = read_jsonl(catalog_path)
+    changed = 0
+    for entry in entries:
+        new_path = remap_path(entry['path'], moved)
+        if new_path != entry['path']:
+            entry['path'] = new_path
+            changed += 1
+    if changed:
+        with open(catalog_path + '.tmp', 'w', encoding='utf-8') as f:
+            for entry in sorted(entries, key=lambda e: e['path']):
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(catalog_path + '.tmp', catalog_path)
+    return changed
@@ -1,11 +1,47 @@
-from bs4 import BeautifulSoup
-from typing import List, Dict, Any
+import re
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.element import PreformattedString
+from typing import Any, Callable, Dict, List, Optional, Union
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
+from utils.log import get_logger
+
+logger = get_logger('parser')
+
+# 正文提取时移除的元素
+_NOISE_TAGS = {'img', 'script', 'style', 'noscript', 'iframe'}
+_AD_CLASSES = {'ad', 'advertisement', 'ads'}
+# 文本密度提取的候选块，以及文本全额计入父块的段落类元素
+_BLOCK_TAGS = {'div', 'p', 'td', 'article', 'section', 'blockquote', 'pre'}
+_PARAGRAPH_TAGS = {'p', 'pre', 'blockquote'}
+
+# 帖子分页参数；不含 p，它在 phpBB 等论坛中是回复ID（如 ?p=123456），不是页码
+_TOPIC_PAGE_PARAMS = ('page', 'start')
+_TOPIC_ID_RE = re.compile(r'/viewtopic/(\d+)')
+
+
+def site_url(site_domain: str) -> str:
+    """站点根URL：site_domain 不带协议时默认https，带协议时原样使用（如本地测试服务器 http://127.0.0.1:8000）"""
+    if '://' in site_domain:
+        return site_domain.rstrip('/')
+    return f'https://{site_domain}'
+
 
 class HtmlParser:
+    @staticmethod
+    def _with_soup(html: str, func, *args):
+        """构建解析树并调用func(soup, *args)，结束后显式释放解析树，降低并发时的峰值内存"""
+        soup = BeautifulSoup(html, 'html.parser')
+        try:
+            return func(soup, *args)
+        finally:
+            soup.decompose()
+    
     def parse_forum_page(self, html: str, site_domain: str = 'wm.wmhuu.com') -> List[Dict[str, str]]:
         """解析版块页面，提取帖子列表"""
+        return self._with_soup(html, self._parse_forum_soup, site_domain)
+    
+    def _parse_forum_soup(self, soup: BeautifulSoup, site_domain: str) -> List[Dict[str, str]]:
         posts = []
-        soup = BeautifulSoup(html, 'html.parser')
         
         # 查找帖子列表项 - 优化选择器，适配常见论坛结构
         post_items = []
@@ -29,7 +65,7 @@ class HtmlParser:
         
         # 如果仍然没有找到，尝试查找所有包含标题链接的元素
         if not post_items:
-            print("未找到标准帖子列表，尝试查找所有标题链接...")
+            logger.topic("未找到标准帖子列表，尝试查找所有标题链接...")
             # 查找所有包含/viewtopic/的链接
             all_links = soup.find_all('a', href=True)
             for link in all_links:
@@ -39,7 +75,7 @@ class HtmlParser:
                     if title and len(title) > 5:  # 过滤掉太短的标题
                         posts.append({
                             'title': title,
-                            'url': href if href.startswith('http') else f'https://{site_domain}{href}'
+                            'url': href if href.startswith('http') else site_url(site_domain) + href
                         })
             return posts
         
@@ -72,21 +108,45 @@ class HtmlParser:
                 if url and title and '/viewtopic/' in url:
                     # 确保URL是完整的
                     if not url.startswith('http'):
-                        url = f'https://{site_domain}{url}'
+                        url = site_url(site_domain) + url
                     
                     posts.append({
                         'title': title,
                         'url': url
                     })
             except Exception as e:
-                print(f"解析帖子项失败: {e}")
+                logger.warning("解析帖子项失败: %s", e)
                 continue
         
         return posts
     
     def parse_topic_page(self, html: str, crawl_mode: str, site_domain: str = 'wm.wmhuu.com') -> Dict[str, Any]:
         """解析帖子详情页，提取内容"""
-        soup = BeautifulSoup(html, 'html.parser')
+        return self._with_soup(html, self._parse_topic_soup, crawl_mode, site_domain)
+    
+    def parse_topic_first_page(self, topic_url: str, html: str,
+                               crawl_mode: Union[str, Callable[[Dict[str, Any]], Optional[str]]],
+                               site_domain: str = 'wm.wmhuu.com', max_pages: int = 50) -> Dict[str, Any]:
+        """解析帖子第一页，只构建一次解析树：返回 {'meta', 'mode', 'content', 'page_urls'}
+
+        crawl_mode 为模式名，或根据 meta（标题和版块ID）返回模式名的函数（按ID发现帖子时由所属版块决定）；
+        模式为None时不提取内容，content 为None、page_urls 为空
+        """
+        return self._with_soup(html, self._parse_first_page_soup, topic_url, crawl_mode, site_domain, max_pages)
+    
+    def _parse_first_page_soup(self, soup: BeautifulSoup, topic_url: str, crawl_mode, site_domain: str,
+                               max_pages: int) -> Dict[str, Any]:
+        meta = self._parse_topic_meta(soup)
+        mode = crawl_mode(meta) if callable(crawl_mode) else crawl_mode
+        result = {'meta': meta, 'mode': mode, 'content': None, 'page_urls': []}
+        if mode is None:
+            return result
+        # 先发现分页，提取正文时会移除噪声元素
+        result['page_urls'] = self._get_topic_page_urls(soup, topic_url, site_domain, max_pages)
+        result['content'] = self._parse_topic_soup(soup, mode, site_domain)
+        return result
+    
+    def _parse_topic_soup(self, soup: BeautifulSoup, crawl_mode: str, site_domain: str) -> Dict[str, Any]:
         result = {
             'content': '',
             'images': []
@@ -125,7 +185,7 @@ class HtmlParser:
                     # 确保URL是完整的
                     if not img_url.startswith('http'):
                         if img_url.startswith('/'):
-                            img_url = f'https://{site_domain}{img_url}'
+                            img_url = site_url(site_domain) + img_url
                         else:
                             continue  # 跳过相对路径的图片
                     
@@ -158,37 +218,153 @@ class HtmlParser:
                     content_elem = elem
                     break
             
-            # 如果仍然没有找到，尝试查找包含大量文本的元素
-            if not content_elem:
-                print("未找到标准内容区域，尝试查找包含大量文本的元素...")
-                # 查找所有段落和div元素，选择文本最多的那个
-                candidates = soup.find_all(['div', 'p'])
-                max_text_len = 0
-                for candidate in candidates:
-                    text = candidate.get_text(strip=True)
-                    if len(text) > max_text_len and len(text) > 100:  # 至少100个字符
-                        max_text_len = len(text)
-                        content_elem = candidate
+            # 如果仍然没有找到，用文本密度选出正文区域（单次遍历，同时收集需要移除的元素）
+            if content_elem:
+                noise = content_elem.find_all(self._is_noise)
+            else:
+                logger.topic("未找到标准内容区域，尝试查找包含大量文本的元素...")
+                content_elem, noise = self._find_dense_block(soup)
             
             if content_elem:
-                # 移除图片等不需要的元素
-                for img in content_elem.find_all('img'):
-                    img.decompose()
-                for script in content_elem.find_all('script'):
-                    script.decompose()
-                for style in content_elem.find_all('style'):
-                    style.decompose()
-                for ad in content_elem.find_all(['div', 'span'], class_=['ad', 'advertisement', 'ads']):
-                    ad.decompose()
+                # 移除图片、脚本、样式和广告
+                for elem in noise:
+                    elem.decompose()
                 
                 content = content_elem.get_text(separator='\n', strip=True)
                 result['content'] = content
         
         return result
     
+    @staticmethod
+    def _is_noise(tag: Tag) -> bool:
+        """图片、脚本、样式以及广告容器"""
+        if tag.name in _NOISE_TAGS:
+            return True
+        if tag.name in ('div', 'span'):
+            return bool(_AD_CLASSES.intersection(tag.get('class') or ()))
+        return False
+    
+    def _find_dense_block(self, soup: BeautifulSoup, min_length: int = 100):
+        """按文本密度选出正文块，返回 (正文元素, 需要移除的元素列表)
+        
+        逆先序遍历保证子节点先于祖先处理，每个节点只访问一次，自底向上累计：
+        - text: 子树文本长度（不含噪声元素），link: 其中链接文本长度
+        - own: 不属于任何下级候选块的文本长度
+        块得分 = own * (1 - 链接密度)，段落类块的得分全额计入父块、半额计入祖父块，
+        因此由大量段落或大段直接文本组成的块得分最高，外层包装块不会因为包含全部文本而胜出
+        
+        噪声元素（如广告容器）内的块不能作为正文：逆先序遍历中噪声元素的后代紧挨在它之前处理，
+        历次最优块按顺序入栈，遇到噪声元素时弹出栈顶位于其子树内的块即恢复此前的最优块。
+        整页只有噪声元素内有正文时，退回其中得分最高的块，只移除该块内部的噪声
+        """
+        stats = {}
+        noise = []
+        # 历次刷新的最优块 [(元素, 得分)]，得分递增
+        candidates = []
+        fallback, fallback_score = None, 0.0
+        for node in reversed(list(soup.descendants)):
+            parent = node.parent
+            if isinstance(node, NavigableString):
+                if isinstance(node, PreformattedString) or parent is None:
+                    continue
+                length = len(node.strip())
+                if length:
+                    info = stats.setdefault(id(parent), [0, 0, 0, 0.0])
+                    info[0] += length
+                    info[2] += length
+                continue
+            
+            if self._is_noise(node):
+                noise.append(node)
+                while candidates and any(ancestor is node for ancestor in candidates[-1][0].parents):
+                    inner, score = candidates.pop()
+                    if score > fallback_score:
+                        fallback, fallback_score = inner, score
+                continue
+            text, link, own, bonus = stats.pop(id(node), (0, 0, 0, 0.0))
+            if node.name == 'a':
+                link = text
+            
+            base = 0.0
+            if node.name in _BLOCK_TAGS:
+                base = own * (1 - link / text) if text else 0.0
+                score = base + bonus
+                if text > min_length and score > (candidates[-1][1] if candidates else 0.0):
+                    candidates.append((node, score))
+            
+            if parent is None:
+                continue
+            info = stats.setdefault(id(parent), [0, 0, 0, 0.0])
+            info[0] += text
+            info[1] += link
+            if node.name not in _BLOCK_TAGS:
+                info[2] += own
+                info[3] += bonus
+            elif node.name in _PARAGRAPH_TAGS:
+                info[3] += base
+                grandparent = parent.parent
+                if grandparent is not None:
+                    stats.setdefault(id(grandparent), [0, 0, 0, 0.0])[3] += base / 2
+        
+        if candidates:
+            return candidates[-1][0], noise
+        if fallback is not None:
+            return fallback, [elem for elem in noise if any(ancestor is fallback for ancestor in elem.parents)]
+        return None, noise
+    
+    def parse_topic_meta(self, html: str) -> Dict[str, Any]:
+        """从帖子详情页提取标题和所属版块ID（按ID直接发现帖子时使用）"""
+        return self._with_soup(html, self._parse_topic_meta)
+    
+    def _parse_topic_meta(self, soup: BeautifulSoup) -> Dict[str, Any]:
+        title = ''
+        title_selectors = [
+            '.topic-title',  # 主题标题
+            '.thread-title',  # 线程标题
+            'h2.topictitle',  # phpBB标题
+            'h1',  # h1标题
+            'h2',  # h2标题
+            'title',  # 页面标题
+        ]
+        for selector in title_selectors:
+            elem = soup.select_one(selector)
+            if elem:
+                title = elem.get_text(strip=True)
+                if title:
+                    break
+        
+        # 面包屑导航中最后一个版块链接即帖子所属版块；没有面包屑时为None，
+        # 不退而取页面中任意版块链接（导航栏中的版块列表会导致误判版块和采集模式）
+        forum_id = None
+        breadcrumb_selectors = [
+            '.breadcrumb',  # 常见面包屑
+            '.breadcrumbs',  # phpBB面包屑
+            '.crumbs',  # 另一种面包屑
+            '.navbar',  # 导航栏
+        ]
+        links = []
+        for selector in breadcrumb_selectors:
+            elem = soup.select_one(selector)
+            if elem:
+                links = elem.find_all('a', href=True)
+                if links:
+                    break
+        for link in reversed(links):
+            match = re.search(r'/viewforum/(\d+)', link.get('href'))
+            if match:
+                forum_id = int(match.group(1))
+                break
+        
+        return {
+            'title': title,
+            'forum_id': forum_id
+        }
+    
     def has_next_page(self, html: str) -> bool:
         """检查是否有下一页"""
-        soup = BeautifulSoup(html, 'html.parser')
+        return self._with_soup(html, self._has_next_page)
+    
+    def _has_next_page(self, soup: BeautifulSoup) -> bool:
         # 查找下一页按钮 - 优化选择器，适配多种分页结构
         next_page_selectors = [
             'a[rel="next"]',  # 标准rel属性
@@ -221,8 +397,9 @@ class HtmlParser:
     
     def get_next_page_url(self, current_url: str, html: str, site_domain: str = 'wm.wmhuu.com') -> str:
         """获取下一页URL"""
-        soup = BeautifulSoup(html, 'html.parser')
-        
+        return self._with_soup(html, self._get_next_page_url, current_url, site_domain)
+    
+    def _get_next_page_url(self, soup: BeautifulSoup, current_url: str, site_domain: str) -> str:
         # 尝试多种下一页选择器
         next_page_selectors = [
             'a[rel="next"]',  # 标准rel属性
@@ -265,11 +442,85 @@ class HtmlParser:
                 # 确保URL是完整的
                 if not next_url.startswith('http'):
                     if next_url.startswith('/'):
-                        next_url = f'https://{site_domain}{next_url}'
+                        next_url = site_url(site_domain) + next_url
                     else:
                         # 相对路径，基于当前URL构建
-                        from urllib.parse import urljoin
                         next_url = urljoin(current_url, next_url)
                 return next_url
         
-        return ''
\ No newline at end of file
+        return ''
+    
+    def get_topic_page_urls(self, topic_url: str, html: str, site_domain: str = 'wm.wmhuu.com', max_pages: int = 50) -> List[str]:
+        """从帖子第一页发现该帖子其余分页的URL，按页序返回（不含第一页）"""
+        return self._with_soup(html, self._get_topic_page_urls, topic_url, site_domain, max_pages)
+    
+    def _get_topic_page_urls(self, soup: BeautifulSoup, topic_url: str, site_domain: str, max_pages: int) -> List[str]:
+        match = _TOPIC_ID_RE.search(topic_url)
+        if not match:
+            return []
+        topic_id = match.group(1)
+        
+        # 收集同一帖子的分页链接：分页参数名 -> {参数值: URL}
+        pages = {}
+        for link in soup.find_all('a', href=True):
+            href = link.get('href')
+            link_match = _TOPIC_ID_RE.search(href)
+            if not link_match or link_match.group(1) != topic_id:
+                continue
+            
+            url = urljoin(site_url(site_domain) + '/', href)
+            query = parse_qs(urlparse(url).query)
+            for param in _TOPIC_PAGE_PARAMS:
+                values = query.get(param)
+                if values and values[0].isdigit():
+                    pages.setdefault(param, {})[int(values[0])] = url
+                    break
+        
+        if not pages:
+            return []
+        
+        # 取链接最多的分页参数，补全被省略号折叠的中间页
+        param, found = max(pages.items(), key=lambda item: len(item[1]))
+        values = sorted(v for v in found if v > 0)
+        if not values:
+            return []
+        
+        if param == 'start':
+            # 偏移分页：步长取相邻偏移的最小差值
+            steps = [b - a for a, b in zip([0] + values, values)]
+            step = min(steps)
+            wanted = list(range(step, values[-1] + 1, step))
+        else:
+            # 页码从最小的链接值推断：出现0说明页码从0开始（第一页为0），否则从1开始
+            first_page = min(found) + 1 if min(found) <= 1 else min(found)
+            wanted = list(range(first_page, values[-1] + 1))
+        wanted = wanted[:max(max_pages - 1, 0)]
+        
+        template = found[values[-1]]
+        return [found.get(value) or self._replace_query_param(template, param, value) for value in wanted]
+    
+    @staticmethod
+    def _replace_query_param(url: str, param: str, value: int) -> str:
+        """替换URL中的查询参数"""
+        parts = urlparse(url)
+        query = parse_qs(parts.query)
+        query[param] = [str(value)]
+        return urlunparse(parts._replace(query=urlencode(query, doseq=True)))
+    
+    @staticmethod
+    def merge_topic_contents(contents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """按页序合并多页帖子的解析结果：正文按页拼接，图片去重保序"""
+        texts = []
+        images = []
+        seen = set()
+        for content in contents:
+            if content['content']:
+                texts.append(content['content'])
+            for img_url in content['images']:
+                if img_url not in seen:
+                    seen.add(img_url)
+                    images.append(img_url)
+        return {
+            'content': '\n\n'.join(texts),
+            'images': images
+        }
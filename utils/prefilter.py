@@ -0,0 +1,111 @@
+import struct
+from typing import Dict, List, Optional, Tuple
+from utils.log import get_logger
+
+logger = get_logger('prefilter')
+
+
+class ImagePrefilter:
+    """图片预过滤：下载前通过Range请求读取文件大小和图片头部尺寸，丢弃过小或过大的图片"""
+
+    def __init__(self, request_handler, min_width: int = 100, min_height: int = 100,
+                 min_bytes: int = 2048, max_bytes: int = 20 * 1024 * 1024, probe_bytes: int = 1024):
+        self.request_handler = request_handler
+        self.min_width = min_width
+        self.min_height = min_height
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.probe_bytes = probe_bytes
+        # 按URL缓存探测结果：url -> (是否保留, 原因)
+        self._cache: Dict[str, Tuple[bool, str]] = {}
+
+    def filter(self, images: List[str]) -> List[str]:
+        """过滤图片列表，返回值得完整下载的图片"""
+        kept = []
+        for img_url in images:
+            keep, reason = self.check(img_url)
+            if keep:
+                kept.append(img_url)
+            else:
+                logger.request("跳过图片 %s: %s", img_url, reason)
+        if len(kept) < len(images):
+            logger.topic("预过滤：%d 张图片中保留 %d 张", len(images), len(kept))
+        return kept
+
+    def check(self, img_url: str) -> Tuple[bool, str]:
+        """检查单张图片是否应该下载，结果按URL缓存"""
+        if img_url in self._cache:
+            return self._cache[img_url]
+
+        result = self._evaluate(img_url)
+        self._cache[img_url] = result
+        return result
+
+    def _evaluate(self, img_url: str) -> Tuple[bool, str]:
+        info = self.request_handler.probe(img_url, self.probe_bytes)
+        if info is None:
+            # 探测失败时不做判断，交给完整下载的重试逻辑处理
+            return True, '探测失败'
+
+        content_length = info['content_length']
+        if content_length is not None:
+            if content_length < self.min_bytes:
+                return False, f'文件过小 ({content_length} 字节)'
+            if self.max_bytes and content_length > self.max_bytes:
+                return False, f'文件过大 ({content_length} 字节)'
+
+        size = self.get_image_size(info['head'])
+        if size:
+            width, height = size
+            if width < self.min_width or height < self.min_height:
+                return False, f'尺寸过小 ({width}x{height})'
+
+        return True, ''
+
+    @staticmethod
+    def get_image_size(head: bytes) -> Optional[Tuple[int, int]]:
+        """从图片头部字节解析宽高，支持PNG/GIF/JPEG/BMP/WEBP，无法识别返回None"""
+        if len(head) >= 24 and head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+
+        if len(head) >= 10 and head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+
+        if len(head) >= 26 and head.startswith(b'BM'):
+            width, height = struct.unpack('<ii', head[18:26])
+            return width, abs(height)
+
+        if len(head) >= 30 and head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ':
+                width, height = struct.unpack('<HH', head[26:30])
+                return width & 0x3fff, height & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(head[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            if chunk == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return width, height
+            return None
+
+        if head.startswith(b'\xff\xd8'):
+            # 遍历JPEG段，找到SOF段读取尺寸
+            i = 2
+            while i + 9 < len(head):
+                if head[i] != 0xff:
+                    i += 1
+                    continue
+                marker = head[i + 1]
+                if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                    i += 2
+                    continue
+                seg_len = struct.unpack('>H', head[i + 2:i + 4])[0]
+                if marker in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7,
+                              0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                    height, width = struct.unpack('>HH', head[i + 5:i + 9])
+                    return width, height
+                i += 2 + seg_len
+            return None
+
+        return None
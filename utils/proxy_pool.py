@@ -0,0 +1,154 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import requests
+from requests.adapters import HTTPAdapter
+from utils.log import get_logger
+
+logger = get_logger('proxy_pool')
+
+
+class ProxyUnavailable(Exception):
+    """等待超时仍没有可用的代理"""
+
+
+class Proxy:
+    """上游代理：独立的连接池、在途请求数和健康度统计
+
+    - latency: 响应时间（到收到响应头）的指数移动平均，未有样本时为0，保证新代理先被试用
+    - error_rate: 连接失败率的指数移动平均
+    - 连续失败 failure_threshold 次后隔离 quarantine 秒，隔离期满放行一个请求，再失败则隔离时间加倍
+    """
+
+    def __init__(self, url: str, max_in_flight: int = 4, smoothing: float = 0.3):
+        self.url = url
+        self.max_in_flight = max_in_flight
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.quarantined_until = 0.0
+        self.quarantine_timeout = 0.0
+
+        self.session = requests.Session()
+        self.session.trust_env = False
+        self.session.verify = False
+        self.session.proxies = {'http': url, 'https': url}
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_in_flight)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._lock = threading.Lock()
+        self.session.hooks['response'].append(self._on_response)
+
+    def _on_response(self, response, *args, **kwargs):
+        # response.elapsed 为发出请求到解析完响应头的时间，不受正文大小影响
+        sample = response.elapsed.total_seconds()
+        with self._lock:
+            self.latency = sample if not self.latency else \
+                self.smoothing * sample + (1 - self.smoothing) * self.latency
+
+    def score(self) -> float:
+        """预计等待时间，越小越好：平均延迟按在途请求数和失败率放大"""
+        return (self.latency + 0.05) * (1 + self.in_flight) * (1 + 4 * self.error_rate)
+
+    def quarantined(self, now: float) -> bool:
+        return now < self.quarantined_until
+
+    def __repr__(self) -> str:
+        return f'Proxy({self.url})'
+
+
+class ProxyPool:
+    """上游代理池：每次请求租用健康度最好且未满载的代理，自动隔离连续失败的代理
+
+    所有代理都被隔离时等待隔离期最先结束的代理恢复，等待超过 acquire_timeout 抛出 ProxyUnavailable
+    """
+
+    def __init__(self, proxies: List[str], max_in_flight: int = 4, failure_threshold: int = 3,
+                 quarantine: float = 60.0, max_quarantine: float = 600.0, smoothing: float = 0.3,
+                 acquire_timeout: float = 60.0):
+        if not proxies:
+            raise ValueError('代理池为空')
+        self.proxies = [Proxy(url, max_in_flight=max(1, max_in_flight), smoothing=smoothing) for url in proxies]
+        self.failure_threshold = failure_threshold
+        self.quarantine = quarantine
+        self.max_quarantine = max_quarantine
+        self.smoothing = smoothing
+        self.acquire_timeout = acquire_timeout
+        self._condition = threading.Condition()
+
+    def acquire(self) -> Proxy:
+        """租用一个代理，全部满载或隔离时等待"""
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                # 隔离期满尚未恢复的代理同一时间只放行一个请求
+                candidates = [proxy for proxy in self.proxies
+                              if proxy.in_flight < (1 if proxy.quarantine_timeout else proxy.max_in_flight)
+                              and not proxy.quarantined(now)]
+                if candidates:
+                    proxy = min(candidates, key=Proxy.score)
+                    proxy.in_flight += 1
+                    return proxy
+                if now >= deadline:
+                    raise ProxyUnavailable(f'{self.acquire_timeout:.0f} 秒内没有可用的代理')
+                # 等待在途请求释放或最早的隔离期结束
+                wake_at = min([deadline] + [proxy.quarantined_until for proxy in self.proxies
+                                            if proxy.quarantined(now)])
+                self._condition.wait(max(0.01, wake_at - now))
+
+    def release(self, proxy: Proxy, ok: bool):
+        """归还代理并更新健康度；ok为False表示代理连接失败或超时"""
+        with self._condition:
+            proxy.in_flight -= 1
+            proxy.requests += 1
+            proxy.error_rate = self.smoothing * (0.0 if ok else 1.0) + (1 - self.smoothing) * proxy.error_rate
+
+            if ok:
+                if proxy.quarantine_timeout:
+                    logger.summary("代理 %s 已恢复", proxy.url)
+                proxy.consecutive_failures = 0
+                proxy.quarantine_timeout = 0.0
+            else:
+                proxy.failures += 1
+                proxy.consecutive_failures += 1
+                if proxy.quarantine_timeout:
+                    # 隔离期满后的探测请求仍失败，隔离时间加倍
+                    proxy.quarantine_timeout = min(proxy.quarantine_timeout * 2, self.max_quarantine)
+                elif proxy.consecutive_failures >= self.failure_threshold:
+                    proxy.quarantine_timeout = self.quarantine
+                if proxy.quarantine_timeout:
+                    proxy.quarantined_until = time.monotonic() + proxy.quarantine_timeout
+                    logger.warning("代理 %s 连续失败 %d 次，隔离 %.0f 秒", proxy.url, proxy.consecutive_failures, proxy.quarantine_timeout)
+            self._condition.notify_all()
+
+    @contextmanager
+    def lease(self) -> Iterator[Proxy]:
+        """租用代理的上下文，连接错误和超时计为代理失败，其余异常（如源站返回的HTTP错误）不影响代理健康度"""
+        proxy = self.acquire()
+        ok = True
+        try:
+            yield proxy
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError):
+            ok = False
+            raise
+        finally:
+            self.release(proxy, ok)
+
+    def summary(self) -> str:
+        """各代理的请求数、失败数、平均延迟和状态"""
+        now = time.monotonic()
+        lines = []
+        with self._condition:
+            for proxy in self.proxies:
+                state = '隔离中' if proxy.quarantined(now) else '正常'
+                lines.append(f"  {proxy.url}: {proxy.requests} 个请求，失败 {proxy.failures} 个，"
+                             f"平均延迟 {proxy.latency * 1000:.0f} ms，{state}")
+        return '\n'.join(lines)
@@ -0,0 +1,224 @@
+import io
+import os
+import json
+import zlib
+import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from utils.manifest import Manifest, read_jsonl, list_run_manifests
+from utils.log import get_logger
+
+logger = get_logger('release')
+
+INDEX_NAME = 'releases.json'
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """多线程gzip压缩：输入按 chunk_size 切块，各块在线程池中独立压缩为一个gzip成员，按顺序拼接
+
+    多成员gzip是标准格式（与 pigz -i、bgzip 相同），tar -xzf 和 gzip -d 可直接解压；
+    zlib压缩时释放GIL，压缩吞吐量随线程数增长。最多 workers*2 个块在压缩中，限制内存占用
+    """
+
+    def __init__(self, fileobj, workers: Optional[int] = None, level: int = 6, chunk_size: int = 4 * 1024 * 1024):
+        super().__init__()
+        self.fileobj = fileobj
+        self.level = level
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.raw_bytes += len(data)
+        while len(self._buffer) >= self.chunk_size:
+            self._submit(bytes(self._buffer[:self.chunk_size]))
+            del self._buffer[:self.chunk_size]
+        return len(data)
+
+    def _submit(self, chunk: bytes):
+        while len(self._pending) >= self.workers * 2:
+            self._write_next()
+        self._pending.append(self._executor.submit(self._compress, chunk, self.level))
+
+    def _write_next(self):
+        member = self._pending.popleft().result()
+        self.fileobj.write(member)
+        self.compressed_bytes += len(member)
+
+    @staticmethod
+    def _compress(chunk: bytes, level: int) -> bytes:
+        # wbits=31 输出带gzip头尾（含CRC32）的完整成员
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(chunk) + compressor.flush()
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._submit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._write_next()
+        finally:
+            self._executor.shutdown()
+            super().close()
+
+
+def load_index(index_path: str) -> dict:
+    """读取发布索引：{'releases': [{name, base, archive, runs, items, bytes, archive_bytes, sha256, created}]}"""
+    if not os.path.exists(index_path):
+        return {'releases': []}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _arcname(path: str) -> str:
+    """归档内路径：相对当前目录，去掉越出当前目录的部分"""
+    path = os.path.normpath(path)
+    if os.path.isabs(path):
+        path = os.path.relpath(path)
+    return '/'.join(part for part in path.split(os.sep) if part not in ('..', '.'))
+
+
+def _catalog_paths(manifest_dir: str) -> Dict[tuple, str]:
+    """全局目录中 (url, sha256) -> 当前路径；--migrate-layout 只更新目录，不改写运行清单"""
+    return {(entry.get('url'), entry.get('sha256')): entry['path']
+            for entry in read_jsonl(os.path.join(manifest_dir, Manifest.CATALOG_NAME))}
+
+
+def _add_entry(entries: Dict[str, dict], entry: dict):
+    current = entries.get(entry['path'])
+    if current is None or entry.get('time', '') >= current.get('time', ''):
+        entries[entry['path']] = entry
+
+
+def pending_entries(manifest_dir: str, index: dict) -> Tuple[List[str], Dict[str, dict]]:
+    """尚未发布的运行清单及其条目（按 path 去重，以保存时间最新的为准）
+
+    重新保存但内容未变的条目（path 和 sha256 都与已发布运行清单中的条目相同）不再打包。
+    运行清单中的路径在迁移保存布局后失效时，按全局目录解析为迁移后的路径；
+    仍找不到文件的条目不打包，其所在的运行清单也不计入本次发布，下次发布时重试
+    """
+    released = {run for release in index['releases'] for run in release.get('runs', [])}
+    all_runs = list_run_manifests(manifest_dir)
+    runs = [name for name in all_runs if name not in released]
+    raw: Dict[str, dict] = {}
+    sources: Dict[str, set] = {}
+    for name in runs:
+        for entry in read_jsonl(os.path.join(manifest_dir, name)):
+            sources.setdefault(entry['path'], set()).add(name)
+            _add_entry(raw, entry)
+
+    # 已发布过的 (path, sha256)
+    published = set()
+    if raw:
+        for name in all_runs:
+            if name in released:
+                published.update((entry['path'], entry.get('sha256'))
+                                 for entry in read_jsonl(os.path.join(manifest_dir, name)))
+
+    entries: Dict[str, dict] = {}
+    incomplete = set()
+    unchanged = 0
+    catalog = None
+    for path, entry in raw.items():
+        if (path, entry.get('sha256')) in published:
+            unchanged += 1
+            continue
+        if not os.path.exists(path):
+            if catalog is None:
+                catalog = _catalog_paths(manifest_dir)
+            new_path = catalog.get((entry.get('url'), entry.get('sha256')))
+            if not new_path or not os.path.exists(new_path):
+                logger.warning("文件不存在，跳过: %s", path)
+                incomplete.update(sources[path])
+                continue
+            if (new_path, entry.get('sha256')) in published:
+                unchanged += 1
+                continue
+            entry = dict(entry, path=new_path)
+        _add_entry(entries, entry)
+    if unchanged:
+        logger.summary("%d 个条目与已发布的内容相同，不再打包", unchanged)
+    if incomplete:
+        logger.warning("%d 个运行清单中有文件不存在，不计入本次发布：%s", len(incomplete), ', '.join(sorted(incomplete)))
+    return [name for name in runs if name not in incomplete], entries
+
+
+def _write_index(index: dict, paths: List[str]):
+    for path in paths:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def build_release(manifest_dir: str, output_dir: str, name: Optional[str] = None, workers: Optional[int] = None,
+                  level: int = 6, chunk_size: int = 4 * 1024 * 1024) -> Optional[dict]:
+    """把上次发布之后新保存的条目打包为增量归档 <output_dir>/<name>.tar.gz，并更新发布索引
+
+    哪些条目已发布由清单决定：索引记录每次发布覆盖的运行清单，本次只打包其余运行清单中的条目。
+    每个增量以上一次发布为 base，按索引顺序依次解压即可还原全部内容。
+    索引保存在 manifest_dir/releases.json，同时复制到 output_dir 一起发布；
+    没有新条目时不生成归档，只复制当前索引（工作流据此跳过发布，最近一次发布仍带有完整索引），返回None
+    """
+    index_path = os.path.join(manifest_dir, INDEX_NAME)
+    index = load_index(index_path)
+    runs, entries = pending_entries(manifest_dir, index)
+    if not entries:
+        _write_index(index, [os.path.join(output_dir, INDEX_NAME)])
+        logger.summary("没有新的保存条目，跳过打包")
+        return None
+
+    name = name or datetime.now().strftime('%Y%m%d-%H%M%S')
+    os.makedirs(output_dir, exist_ok=True)
+    archive_path = os.path.join(output_dir, f'{name}.tar.gz')
+    items = []
+    modes: Dict[str, int] = {}
+
+    with open(archive_path, 'wb') as f:
+        gzip_writer = ParallelGzipWriter(f, workers=workers, level=level, chunk_size=chunk_size)
+        with tarfile.open(fileobj=gzip_writer, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+            for path in sorted(entries):
+                entry = dict(entries[path], path=_arcname(path))
+                tar.add(path, arcname=entry['path'], recursive=False)
+                items.append(entry)
+                modes[entry.get('mode', '')] = modes.get(entry.get('mode', ''), 0) + 1
+            # 本次增量的条目清单，解压后位于 manifests/ 下
+            listing = ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in items).encode('utf-8')
+            info = tarfile.TarInfo(f'manifests/release_{name}.jsonl')
+            info.size = len(listing)
+            info.mtime = int(datetime.now().timestamp())
+            tar.addfile(info, io.BytesIO(listing))
+        gzip_writer.close()
+
+    release = {
+        'name': name,
+        'base': index['releases'][-1]['name'] if index['releases'] else None,
+        'archive': os.path.basename(archive_path),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'runs': runs,
+        'items': len(items),
+        'modes': modes,
+        'bytes': gzip_writer.raw_bytes,
+        'archive_bytes': gzip_writer.compressed_bytes,
+        'sha256': Manifest.file_digest(archive_path)[1]
+    }
+    index['releases'].append(release)
+    _write_index(index, [index_path, os.path.join(output_dir, INDEX_NAME)])
+
+    logger.summary("增量归档 %s：%d 项，原始 %.1f MB，压缩后 %.1f MB，基于 %s", archive_path, len(items),
+                   release['bytes'] / 1024 / 1024, release['archive_bytes'] / 1024 / 1024, release['base'] or '（无，完整基线）')
+    return release
+
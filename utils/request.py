@@ -1,19 +1,51 @@
 import requests
 import time
 import os
+import hashlib
+import re
+import codecs
 import warnings
-from typing import Dict, Any, Optional
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+from utils.retry import RetryPolicy, CircuitBreaker, CircuitOpenError, RetryBudgetExhausted
+from utils.proxy_pool import ProxyPool, ProxyUnavailable
+from utils.log import get_logger
+
+logger = get_logger('request')
 
 # 忽略SSL验证警告
 warnings.filterwarnings('ignore', message='Unverified HTTPS request is being made to host')
 warnings.filterwarnings('ignore', category=requests.packages.urllib3.exceptions.InsecureRequestWarning)
 
+# 从Content-Type头和<meta>标签中提取字符集
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
 class RequestHandler:
-    def __init__(self, headers: Dict[str, str], timeout: int = 10, delay: float = 1, retry_times: int = 3, proxies: Optional[Dict[str, str]] = None):
+    def __init__(self, headers: Dict[str, str], timeout: int = 10, delay: float = 1, retry_times: int = 3, proxies: Optional[Dict[str, str]] = None,
+                 max_body_size: int = 5 * 1024 * 1024, sniff_bytes: int = 4096, retry_policy: Optional[RetryPolicy] = None,
+                 proxy_pool: Optional[ProxyPool] = None, max_file_size: int = 50 * 1024 * 1024):
         self.headers = headers
         self.timeout = timeout
         self.delay = delay
         self.retry_times = retry_times
+        # 重试策略（指数退避、重试预算、按主机熔断），get/download_file/probe共用
+        self.retry_policy = retry_policy or RetryPolicy(
+            max_attempts=retry_times,
+            base_delay=delay,
+            breaker=CircuitBreaker()
+        )
+        # 页面最大读取字节数，超出部分丢弃，避免超大页面占用过多内存
+        self.max_body_size = max_body_size
+        # 下载到内存的单个文件最大字节数（后写式存储），超出时放弃该文件
+        self.max_file_size = max_file_size
+        # <meta>字符集嗅探只检查前sniff_bytes字节
+        self.sniff_bytes = sniff_bytes
+        # 按域名缓存已解析的字符集
+        self._charset_cache: Dict[str, str] = {}
+        # 上游代理池，配置后请求经健康度最好的代理发出，否则直连
+        self.proxy_pool = proxy_pool
         
         # 构建代理字典，支持分别配置http和https代理
         self.proxies = {}
@@ -41,7 +73,7 @@ class RequestHandler:
         for var in proxy_vars:
             if var in os.environ:
                 del os.environ[var]
-                print(f"已清除代理环境变量: {var}")
+                logger.topic("已清除代理环境变量: %s", var)
     
     def _force_disable_proxy(self):
         """强制禁用代理，确保不受系统设置影响"""
@@ -53,135 +85,258 @@ class RequestHandler:
         from urllib.request import getproxies
         
         # 打印当前代理设置，用于调试
-        print(f"系统代理设置: {getproxies()}")
+        logger.request("系统代理设置: %s", getproxies())
         
         # 确保requests库不使用代理
         session = requests.Session()
         session.trust_env = False
         session.proxies = {}
     
+    def _new_session(self) -> requests.Session:
+        """创建不使用代理、不验证SSL的Session"""
+        # 强制禁用代理，确保不受系统设置影响
+        self._force_disable_proxy()
+        
+        session = requests.Session()
+        # 强制不使用任何代理
+        session.proxies = {}
+        # 禁用SSL验证
+        session.verify = False
+        # 强制不信任环境变量
+        session.trust_env = False
+        return session
+    
+    @contextmanager
+    def _session(self) -> Iterator[requests.Session]:
+        """获取本次请求使用的Session：配置了代理池时租用一个代理（复用其连接池），否则新建直连Session"""
+        if not self.proxy_pool:
+            yield self._new_session()
+            return
+        with self.proxy_pool.lease() as proxy:
+            yield proxy.session
+    
     def get(self, url: str) -> str:
-        """发送GET请求，支持重试机制"""
-        for i in range(self.retry_times):
+        """发送GET请求，按重试策略重试"""
+        try:
+            text = self.retry_policy.execute(url, lambda: self._fetch_text(url))
+        except (CircuitOpenError, RetryBudgetExhausted, ProxyUnavailable) as e:
+            logger.warning("%s，跳过此URL: %s", e, url)
+            return ""
+        except Exception as e:
+            logger.warning("请求失败，跳过此URL %s: %s", url, e)
+            return ""
+        time.sleep(self.delay)  # 请求延迟
+        return text
+    
+    def _fetch_text(self, url: str) -> str:
+        """流式读取页面，限制最大字节数，并解析字符集后解码"""
+        with self._session() as session:
+            response = session.get(
+                url, 
+                headers=self.headers, 
+                timeout=self.timeout,
+                stream=True
+            )
             try:
-                # 强制禁用代理，确保不受系统设置影响
-                self._force_disable_proxy()
-                
-                # 使用Session对象
-                session = requests.Session()
-                # 强制不使用任何代理
-                session.proxies = {}
-                # 禁用SSL验证
-                session.verify = False
-                # 强制不信任环境变量
-                session.trust_env = False
+                response.raise_for_status()
                 
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=65536):
+                    if not chunk:
+                        continue
+                    body += chunk
+                    if self.max_body_size and len(body) >= self.max_body_size:
+                        logger.warning("页面超过 %d 字节，截断读取: %s", self.max_body_size, url)
+                        del body[self.max_body_size:]
+                        break
+            finally:
+                response.close()
+        
+        encoding = self._resolve_encoding(url, response.headers.get('Content-Type', ''), body)
+        return body.decode(encoding, errors='replace')
+    
+    def _resolve_encoding(self, url: str, content_type: str, body: bytes) -> str:
+        """解析页面字符集：响应头 > 域名缓存 > <meta>嗅探 > utf-8"""
+        match = _HEADER_CHARSET_RE.search(content_type)
+        if match and self._valid_encoding(match.group(1)):
+            return match.group(1)
+        
+        domain = urlparse(url).netloc
+        if domain in self._charset_cache:
+            return self._charset_cache[domain]
+        
+        encoding = 'utf-8'
+        match = _META_CHARSET_RE.search(body[:self.sniff_bytes])
+        if match:
+            sniffed = match.group(1).decode('ascii', errors='ignore')
+            if self._valid_encoding(sniffed):
+                encoding = sniffed
+        
+        self._charset_cache[domain] = encoding
+        return encoding
+    
+    @staticmethod
+    def _valid_encoding(name: str) -> bool:
+        try:
+            codecs.lookup(name)
+            return True
+        except LookupError:
+            return False
+    
+    def download_file(self, url: str, save_path: str) -> Optional[Tuple[int, str]]:
+        """下载文件，按重试策略重试；成功时返回 (大小, sha256)（写入时顺带计算，无需回读文件），失败时返回None"""
+        def fetch():
+            with self._session() as session:
                 response = session.get(
                     url, 
                     headers=self.headers, 
-                    timeout=self.timeout
+                    timeout=self.timeout, 
+                    stream=True
                 )
-                response.raise_for_status()
-                time.sleep(self.delay)  # 请求延迟
-                return response.text
-            except requests.exceptions.ProxyError as e:
-                print(f"代理错误 {url}: {e}")
-                print("将尝试不使用代理重试...")
-                # 重试时不使用代理
                 try:
-                    session = requests.Session()
-                    session.proxies = {}
-                    session.verify = False
-                    session.trust_env = False
-                    
-                    response = session.get(
-                        url, 
-                        headers=self.headers, 
-                        timeout=self.timeout
-                    )
                     response.raise_for_status()
-                    time.sleep(self.delay)
-                    return response.text
-                except requests.RequestException as e2:
-                    print(f"不使用代理重试失败: {e2}")
-            except requests.RequestException as e:
-                print(f"请求失败 {url}: {e}")
-            except Exception as e:
-                print(f"未知错误 {url}: {e}")
-            
-            if i < self.retry_times - 1:
-                print(f"{i+1}/{self.retry_times} 重试中...")
-                time.sleep(self.delay * 2)  # 重试延迟加倍
+                    digest = hashlib.sha256()
+                    size = 0
+                    with open(save_path, 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=8192):
+                            if chunk:
+                                f.write(chunk)
+                                digest.update(chunk)
+                                size += len(chunk)
+                    return size, digest.hexdigest()
+                finally:
+                    response.close()
+        
+        try:
+            result = self.retry_policy.execute(url, fetch)
+        except Exception as e:
+            if isinstance(e, (CircuitOpenError, RetryBudgetExhausted, ProxyUnavailable)):
+                logger.warning("%s，跳过此文件: %s", e, url)
             else:
-                print(f"{self.retry_times}次重试后仍失败，跳过此URL")
-                return ""
+                logger.warning("下载失败，跳过此文件 %s: %s", url, e)
+            # 删除中断下载留下的不完整文件
+            if os.path.exists(save_path):
+                os.remove(save_path)
+            return None
+        time.sleep(self.delay)
+        return result
     
-    def download_file(self, url: str, save_path: str) -> bool:
-        """下载文件"""
-        for i in range(self.retry_times):
-            try:
-                # 强制禁用代理，确保不受系统设置影响
-                self._force_disable_proxy()
-                
-                # 使用Session对象
-                session = requests.Session()
-                # 强制不使用任何代理
-                session.proxies = {}
-                # 禁用SSL验证
-                session.verify = False
-                # 强制不信任环境变量
-                session.trust_env = False
-                
+    def fetch_bytes(self, url: str) -> Optional[bytes]:
+        """下载文件内容到内存（交给后写式存储写盘），按重试策略重试，失败或超过 max_file_size 时返回None"""
+        def fetch():
+            with self._session() as session:
                 response = session.get(
-                    url, 
-                    headers=self.headers, 
-                    timeout=self.timeout, 
+                    url,
+                    headers=self.headers,
+                    timeout=self.timeout,
                     stream=True
                 )
-                response.raise_for_status()
+                try:
+                    response.raise_for_status()
+                    declared = response.headers.get('Content-Length', '')
+                    if self.max_file_size and declared.isdigit() and int(declared) > self.max_file_size:
+                        return None
+                    body = bytearray()
+                    for chunk in response.iter_content(chunk_size=65536):
+                        if not chunk:
+                            continue
+                        body += chunk
+                        if self.max_file_size and len(body) > self.max_file_size:
+                            return None
+                    return bytes(body)
+                finally:
+                    response.close()
+        
+        try:
+            data = self.retry_policy.execute(url, fetch)
+            if data is None:
+                logger.warning("文件超过 %d 字节，跳过: %s", self.max_file_size, url)
+                return None
+        except Exception as e:
+            if isinstance(e, (CircuitOpenError, RetryBudgetExhausted, ProxyUnavailable)):
+                logger.warning("%s，跳过此文件: %s", e, url)
+            else:
+                logger.warning("下载失败，跳过此文件 %s: %s", url, e)
+            return None
+        time.sleep(self.delay)
+        return data
+    
+    def probe(self, url: str, max_bytes: int = 1024) -> Optional[Dict[str, Any]]:
+        """探测资源：使用Range请求只读取响应头和前max_bytes字节，不做重试
+        
+        返回 {'status', 'content_length', 'content_type', 'head'}，失败返回None
+        """
+        headers = dict(self.headers)
+        headers['Range'] = f'bytes=0-{max_bytes - 1}'
+        
+        def fetch():
+            with self._session() as session:
+                response = session.get(
+                    url,
+                    headers=headers,
+                    timeout=self.timeout,
+                    stream=True
+                )
+                try:
+                    response.raise_for_status()
                 
-                with open(save_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+                    # 206时Content-Range中的总长度才是完整文件大小
+                    content_length = None
+                    content_range = response.headers.get('Content-Range', '')
+                    if '/' in content_range and not content_range.endswith('/*'):
+                        content_length = int(content_range.rsplit('/', 1)[1])
+                    elif response.status_code == 200 and response.headers.get('Content-Length'):
+                        content_length = int(response.headers['Content-Length'])
                 
-                time.sleep(self.delay)
-                return True
-            except requests.exceptions.ProxyError as e:
-                print(f"代理错误 {url}: {e}")
-                print("将尝试不使用代理重试...")
-                # 重试时不使用代理
-                try:
-                    session = requests.Session()
-                    session.proxies = {}
-                    session.verify = False
-                    session.trust_env = False
-                    
+                    # 服务器忽略Range时也只读取前max_bytes字节
+                    head = b''
+                    for chunk in response.iter_content(chunk_size=max_bytes):
+                        head += chunk
+                        if len(head) >= max_bytes:
+                            break
+                
+                    return {
+                        'status': response.status_code,
+                        'content_length': content_length,
+                        'content_type': response.headers.get('Content-Type', ''),
+                        'head': head[:max_bytes]
+                    }
+                finally:
+                    response.close()
+        
+        try:
+            # 探测只尝试一次，但同样受熔断保护
+            return self.retry_policy.execute(url, fetch, max_attempts=1)
+        except (requests.RequestException, ValueError, CircuitOpenError, ProxyUnavailable) as e:
+            logger.warning("探测失败 %s: %s", url, e)
+            return None
+    
+    def exists(self, url: str) -> Optional[bool]:
+        """用HEAD请求检查页面是否存在（不做重试），被重定向到其他页面也视为不存在，出错返回None"""
+        def fetch():
+            with self._session() as session:
+                response = session.head(
+                    url,
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    allow_redirects=True
+                )
+                if response.status_code == 405:
+                    # 不支持HEAD时退回只读取1字节的GET
                     response = session.get(
-                        url, 
-                        headers=self.headers, 
-                        timeout=self.timeout, 
+                        url,
+                        headers=dict(self.headers, Range='bytes=0-0'),
+                        timeout=self.timeout,
                         stream=True
                     )
-                    response.raise_for_status()
-                    
-                    with open(save_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=8192):
-                            if chunk:
-                                f.write(chunk)
-                    
-                    time.sleep(self.delay)
-                    return True
-                except requests.RequestException as e2:
-                    print(f"不使用代理重试失败: {e2}")
-            except requests.RequestException as e:
-                print(f"下载失败 {url}: {e}")
-            except Exception as e:
-                print(f"未知错误 {url}: {e}")
-            
-            if i < self.retry_times - 1:
-                print(f"{i+1}/{self.retry_times} 重试中...")
-                time.sleep(self.delay * 2)
-            else:
-                print(f"{self.retry_times}次重试后仍失败，跳过此文件")
-                return False
\ No newline at end of file
+                    response.close()
+                if response.status_code in (404, 410):
+                    return False
+                response.raise_for_status()
+                return urlparse(response.url).path == urlparse(url).path
+        
+        try:
+            return self.retry_policy.execute(url, fetch, max_attempts=1)
+        except Exception as e:
+            logger.warning("检查页面失败 %s: %s", url, e)
+            return None
@@ -0,0 +1,189 @@
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from utils.proxy_pool import ProxyUnavailable
+from utils.log import get_logger
+
+logger = get_logger('retry')
+
+T = TypeVar('T')
+
+
+class CircuitOpenError(Exception):
+    """主机熔断中，请求被快速拒绝"""
+
+
+class RetryBudgetExhausted(Exception):
+    """全局重试预算已用完"""
+
+
+class CircuitBreaker:
+    """按主机的熔断器
+
+    - closed: 正常放行，连续失败达到 failure_threshold 次后进入 open
+    - open: 快速失败，reset_timeout 秒后进入 half_open
+    - half_open: 只放行一个探测请求，成功则恢复 closed，失败则重新 open（冷却时间加倍，上限 max_reset_timeout）
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, max_reset_timeout: float = 300.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, dict] = {}
+
+    def _host(self, host: str) -> dict:
+        if host not in self._hosts:
+            self._hosts[host] = {'state': 'closed', 'failures': 0, 'opened_at': 0.0,
+                                 'timeout': self.reset_timeout, 'probing': False}
+        return self._hosts[host]
+
+    def state(self, host: str) -> str:
+        with self._lock:
+            return self._host(host)['state']
+
+    def allow(self, host: str) -> bool:
+        """判断是否放行对该主机的请求"""
+        with self._lock:
+            info = self._host(host)
+            if info['state'] == 'closed':
+                return True
+            if info['state'] == 'open':
+                if time.monotonic() - info['opened_at'] < info['timeout']:
+                    return False
+                info['state'] = 'half_open'
+                info['probing'] = False
+            # half_open：同一时间只放行一个探测请求
+            if info['probing']:
+                return False
+            info['probing'] = True
+            return True
+
+    def record_success(self, host: str):
+        with self._lock:
+            info = self._host(host)
+            if info['state'] != 'closed':
+                logger.summary("主机 %s 已恢复，关闭熔断", host)
+            info.update(state='closed', failures=0, timeout=self.reset_timeout, probing=False)
+
+    def release(self, host: str):
+        """请求的结果不能说明主机状态（如代理故障）：不改变状态，只归还半开状态下的探测名额"""
+        with self._lock:
+            self._host(host)['probing'] = False
+
+    def record_failure(self, host: str):
+        with self._lock:
+            info = self._host(host)
+            info['failures'] += 1
+            if info['state'] == 'half_open':
+                info['timeout'] = min(info['timeout'] * 2, self.max_reset_timeout)
+                info.update(state='open', opened_at=time.monotonic(), probing=False)
+                logger.warning("主机 %s 探测失败，继续熔断 %.0f 秒", host, info['timeout'])
+            elif info['state'] == 'closed' and info['failures'] >= self.failure_threshold:
+                info.update(state='open', opened_at=time.monotonic())
+                logger.warning("主机 %s 连续失败 %d 次，熔断 %.0f 秒", host, info['failures'], info['timeout'])
+
+
+class RetryPolicy:
+    """统一的重试策略：指数退避加随机抖动、可重试状态码分类、全局重试预算和按主机熔断"""
+
+    RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 retry_budget: int = 500, retry_statuses=RETRY_STATUSES,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.retry_statuses = set(retry_statuses)
+        self.breaker = breaker
+        self._lock = threading.Lock()
+        self.retries_used = 0
+
+    def is_retryable(self, error: Exception) -> bool:
+        """连接错误、超时和可重试状态码可以重试，其余错误（如404）直接失败"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            response = error.response
+            return response is not None and response.status_code in self.retry_statuses
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                                  requests.exceptions.ChunkedEncodingError))
+
+    @staticmethod
+    def _is_host_failure(error: Exception) -> bool:
+        """只有连接失败、超时和5xx说明主机有问题，4xx不计入熔断（代理故障由 _is_proxy_failure 单独判断）"""
+        if isinstance(error, requests.exceptions.HTTPError):
+            response = error.response
+            return response is not None and response.status_code >= 500
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+    @staticmethod
+    def _is_proxy_failure(error: Exception) -> bool:
+        """代理连接失败或没有可用代理：请求没有到达源站，既不算主机失败也不算成功"""
+        return isinstance(error, (requests.exceptions.ProxyError, ProxyUnavailable))
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """第attempt次重试前的等待时间：全抖动指数退避，服务端给出Retry-After时取较大值"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.max_delay))
+        return delay
+
+    @staticmethod
+    def _retry_after(error: Optional[Exception]) -> Optional[float]:
+        response = getattr(error, 'response', None)
+        if response is None:
+            return None
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    def _take_retry(self) -> bool:
+        with self._lock:
+            if self.retry_budget is not None and self.retries_used >= self.retry_budget:
+                return False
+            self.retries_used += 1
+            return True
+
+    def execute(self, url: str, func: Callable[[], T], max_attempts: Optional[int] = None) -> T:
+        """按策略执行func，成功返回其结果，最终失败时抛出最后一次的异常"""
+        host = urlparse(url).netloc
+        attempts = max_attempts or self.max_attempts
+        for attempt in range(attempts):
+            if self.breaker and not self.breaker.allow(host):
+                raise CircuitOpenError(f'主机 {host} 熔断中')
+            try:
+                result = func()
+            except Exception as e:
+                if self.breaker:
+                    if self._is_proxy_failure(e):
+                        self.breaker.release(host)
+                    elif self._is_host_failure(e):
+                        self.breaker.record_failure(host)
+                    else:
+                        self.breaker.record_success(host)
+                if not self.is_retryable(e) or attempt == attempts - 1:
+                    raise
+                if not self._take_retry():
+                    raise RetryBudgetExhausted(f'全局重试预算 {self.retry_budget} 次已用完: {e}') from e
+                delay = self.backoff(attempt, e)
+                logger.request("请求失败 %s: %s，%d/%d %.1f 秒后重试...", url, e, attempt + 1, attempts, delay)
+                time.sleep(delay)
+                continue
+            if self.breaker:
+                self.breaker.record_success(host)
+            return result
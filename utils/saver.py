@@ -1,24 +1,48 @@
 import os
+import threading
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Callable
+from utils.layout import SaveLayout
+from utils.log import get_logger
+
+logger = get_logger('saver')
 
 class ContentSaver:
-    def __init__(self, save_paths: dict):
+    def __init__(self, save_paths: dict, search_index=None, manifest=None, layout: SaveLayout = None, writer=None):
         self.save_paths = save_paths
+        # 保存目录布局（平铺或哈希分片）
+        self.layout = layout or SaveLayout()
+        # 全文索引（NovelIndex），保存小说时同步更新
+        self.search_index = search_index
+        # 保存清单（Manifest），每保存一项追加一条记录
+        self.manifest = manifest
+        # 后写式存储（WriteBehindWriter），配置后由专用I/O线程写盘，清单和索引在写入成功后更新
+        self.writer = writer
+        # 实际写入成功的数量（后写模式下在写盘完成后才计数），按模式统计
+        self.saved = {'picture': 0, 'novel': 0}
+        self._saved_lock = threading.Lock()
         # 创建保存目录
         for path in save_paths.values():
             os.makedirs(path, exist_ok=True)
     
-    def save_pictures(self, topic_title: str, images: List[str], request_handler) -> int:
-        """保存图片到指定目录"""
+    def save_pictures(self, topic_title: str, images: List[str], request_handler, topic_url: str = '',
+                      should_stop: Optional[Callable[[], bool]] = None) -> int:
+        """保存图片到指定目录，should_stop返回True时停止下载剩余图片
+
+        返回保存的图片数；后写模式下为已提交写盘的数量，实际写入数见 saved
+        """
         # 清理标题中的非法字符
         safe_title = self._sanitize_filename(topic_title)
         # 创建帖子目录
-        topic_dir = os.path.join(self.save_paths['picture'], safe_title)
-        os.makedirs(topic_dir, exist_ok=True)
+        topic_dir = self.layout.path_for(self.save_paths['picture'], safe_title)
+        if not self.writer:
+            os.makedirs(topic_dir, exist_ok=True)
         
         saved_count = 0
         for i, img_url in enumerate(images):
+            if should_stop and should_stop():
+                logger.topic("时间不足，跳过剩余 %d 张图片", len(images) - i)
+                break
             try:
                 # 获取图片扩展名
                 ext = img_url.split('.')[-1].lower()
@@ -29,31 +53,90 @@ class ContentSaver:
                 img_name = f'image_{i+1}.{ext}'
                 save_path = os.path.join(topic_dir, img_name)
                 
-                # 下载图片
-                if request_handler.download_file(img_url, save_path):
-                    saved_count += 1
-                    print(f"已保存图片: {save_path}")
+                # 下载图片，后写模式下只下载到内存并提交写盘
+                if self.writer:
+                    data = request_handler.fetch_bytes(img_url)
+                    if data is not None:
+                        saved_count += 1
+                        self.writer.submit(save_path, data, self._on_written(
+                            save_path, 'picture', topic_title, img_url, topic_url, data))
+                else:
+                    downloaded = request_handler.download_file(img_url, save_path)
+                    if downloaded:
+                        saved_count += 1
+                        self._count_saved('picture')
+                        logger.request("已保存图片: %s", save_path)
+                        if self.manifest:
+                            size, sha256 = downloaded
+                            self.manifest.record(save_path, 'picture', topic_title, url=img_url, topic_url=topic_url,
+                                                 size=size, sha256=sha256)
             except Exception as e:
-                print(f"保存图片失败 {img_url}: {e}")
+                logger.warning("保存图片失败 %s: %s", img_url, e)
                 continue
         
         return saved_count
     
-    def save_novel(self, topic_title: str, content: str) -> bool:
-        """保存小说内容到文本文件"""
+    def save_novel(self, topic_title: str, content: str, topic_url: str = '') -> bool:
+        """保存小说内容到文本文件；后写模式下返回True表示已提交写盘，实际写入数见 saved"""
         # 清理标题中的非法字符
         safe_title = self._sanitize_filename(topic_title)
         # 构建保存路径
-        save_path = os.path.join(self.save_paths['novel'], f'{safe_title}.txt')
+        save_path = self.layout.path_for(self.save_paths['novel'], f'{safe_title}.txt')
         
-        try:
-            with open(save_path, 'w', encoding='utf-8') as f:
-                f.write(content)
-            print(f"已保存小说: {save_path}")
+        data = content.encode('utf-8')
+        if self.writer:
+            self.writer.submit(save_path, data, self._on_written(
+                save_path, 'novel', topic_title, topic_url, topic_url, data, content))
             return True
+        
+        try:
+            if self.layout.sharded:
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            with open(save_path, 'wb') as f:
+                f.write(data)
+            logger.request("已保存小说: %s", save_path)
+            self._count_saved('novel')
         except Exception as e:
-            print(f"保存小说失败: {e}")
+            logger.error("保存小说失败: %s", e)
             return False
+        
+        if self.manifest:
+            self.manifest.record(save_path, 'novel', topic_title, url=topic_url, topic_url=topic_url, data=data)
+        
+        self._index_novel(save_path, topic_title, content)
+        return True
+    
+    def _index_novel(self, save_path: str, topic_title: str, content: str):
+        if self.search_index:
+            try:
+                self.search_index.add(save_path, topic_title, content)
+            except Exception as e:
+                # 索引失败不影响保存结果，可通过 --rebuild-index 补齐
+                logger.warning("更新索引失败 %s: %s", save_path, e)
+    
+    def _on_written(self, save_path: str, mode: str, topic_title: str, url: str, topic_url: str,
+                    data: bytes, content: Optional[str] = None) -> Callable[[], None]:
+        """后写模式下文件写入成功后的回调：记录清单，小说同时更新索引"""
+        def on_written():
+            self._count_saved(mode)
+            if self.manifest:
+                self.manifest.record(save_path, mode, topic_title, url=url, topic_url=topic_url, data=data)
+            if content is not None:
+                self._index_novel(save_path, topic_title, content)
+        return on_written
+    
+    def _count_saved(self, mode: str):
+        with self._saved_lock:
+            self.saved[mode] = self.saved.get(mode, 0) + 1
+    
+    def close(self):
+        """结束保存，等待后台写盘完成，写出尚未落盘的索引数据并关闭清单"""
+        if self.writer:
+            self.writer.close()
+        if self.search_index:
+            self.search_index.flush()
+        if self.manifest:
+            self.manifest.close()
     
     @staticmethod
     def _sanitize_filename(filename: str) -> str:
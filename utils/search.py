@@ -0,0 +1,326 @@
+import os
+import re
+import json
+import math
+import hashlib
+import mmap
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from utils.log import get_logger
+
+logger = get_logger('search')
+
+# CJK字符按二元组切分，其余字母数字按单词切分
+_TOKEN_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+|[0-9a-z]+')
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]')
+
+
+def tokenize(text: str) -> List[str]:
+    """CJK感知分词：连续CJK字符切成二元组（单字保留为一元），字母数字按单词小写"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varints(data: bytes) -> List[int]:
+    values = []
+    value = shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+
+class NovelIndex:
+    """小说全文倒排索引，增量维护
+
+    磁盘格式（index_path目录下）：
+    - docs.jsonl: 文档表，每行 {id, path, title, len, sha256}，同一路径以最后一条为准
+    - next_id: 已分配的最大文档ID+1
+    - seg_NNNNNN.terms: 按UTF-8字节排序的词典，每行 "词\\t偏移\\t长度"，查询时mmap二分查找
+    - seg_NNNNNN.post: 倒排列表，varint编码的 (文档ID差值, 词频) 序列
+    新文档先缓存在内存中，每flush_every篇写出一个段，段数超过max_segments时合并增量段；
+    同一路径内容未变时不重新索引，合并段时丢弃已失效文档的倒排项
+    """
+
+    def __init__(self, index_path: str, flush_every: int = 50, max_segments: int = 8):
+        self.index_path = index_path
+        self.flush_every = flush_every
+        self.max_segments = max_segments
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[int, int]] = {}
+        self._pending_docs: List[dict] = []
+        # 路径 -> 最新文档的内容哈希，首次添加时从文档表加载
+        self._hashes: Optional[Dict[str, str]] = None
+        os.makedirs(index_path, exist_ok=True)
+        self._docs_path = os.path.join(index_path, 'docs.jsonl')
+        self._next_id_path = os.path.join(index_path, 'next_id')
+        self._next_id = self._read_next_id()
+
+    def _read_next_id(self) -> int:
+        next_id = 0
+        if os.path.exists(self._docs_path):
+            with open(self._docs_path, 'rb') as f:
+                next_id = sum(1 for _ in f)
+        if os.path.exists(self._next_id_path):
+            with open(self._next_id_path, 'r', encoding='utf-8') as f:
+                next_id = max(next_id, int(f.read().strip() or 0))
+        return next_id
+
+    def _segments(self) -> List[str]:
+        names = sorted(name[:-6] for name in os.listdir(self.index_path) if name.endswith('.terms'))
+        return [os.path.join(self.index_path, name) for name in names]
+
+    def add(self, path: str, title: str, content: str):
+        """添加（或更新）一篇小说，同一路径重复添加时旧文档失效；标题和内容都未变时跳过"""
+        path = os.path.normpath(path)
+        text = title + '\n' + content
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = {doc['path']: doc.get('sha256') for doc in self._load_docs().values()}
+                self._hashes.update((doc['path'], doc['sha256']) for doc in self._pending_docs)
+            if self._hashes.get(path) == digest:
+                return
+            self._hashes[path] = digest
+        counts = Counter(tokenize(text))
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._pending_docs.append({
+                'id': doc_id,
+                'path': path,
+                'title': title,
+                'len': sum(counts.values()),
+                'sha256': digest
+            })
+            for term, tf in counts.items():
+                self._pending.setdefault(term, {})[doc_id] = tf
+            if len(self._pending_docs) >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        """把内存中的新文档写成一个段"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._pending_docs:
+            return
+        # 先记录已分配的文档ID，再写段和文档表；中断时留下的孤立倒排项不会被新文档复用
+        with open(self._next_id_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(str(self._next_id))
+        os.replace(self._next_id_path + '.tmp', self._next_id_path)
+        segments = self._segments()
+        last = int(os.path.basename(segments[-1])[4:]) if segments else 0
+        self._write_segment(os.path.join(self.index_path, f'seg_{last + 1:06d}'), self._pending)
+        with open(self._docs_path, 'a', encoding='utf-8') as f:
+            for doc in self._pending_docs:
+                f.write(json.dumps(doc, ensure_ascii=False) + '\n')
+        self._pending = {}
+        self._pending_docs = []
+        if len(segments) + 1 > self.max_segments:
+            # 自动合并保留最早的基础段，只合并增量段，避免每次重写整个索引
+            self._compact_locked(keep_base=True)
+
+    @staticmethod
+    def _write_segment(base: str, postings: Dict[str, Dict[int, int]]):
+        data = bytearray()
+        lines = []
+        for term in sorted(postings, key=lambda t: t.encode('utf-8')):
+            offset = len(data)
+            prev = 0
+            for doc_id in sorted(postings[term]):
+                _encode_varint(doc_id - prev, data)
+                _encode_varint(postings[term][doc_id], data)
+                prev = doc_id
+            lines.append(f'{term}\t{offset}\t{len(data) - offset}\n')
+        with open(base + '.post.tmp', 'wb') as f:
+            f.write(data)
+        with open(base + '.terms.tmp', 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(base + '.post.tmp', base + '.post')
+        os.replace(base + '.terms.tmp', base + '.terms')
+
+    def compact(self):
+        """把所有段合并为一个段"""
+        with self._lock:
+            self._flush_locked()
+            self._compact_locked()
+
+    def _compact_locked(self, keep_base: bool = False):
+        segments = self._segments()
+        if keep_base:
+            segments = segments[1:]
+        if len(segments) <= 1:
+            return
+        # 同一路径被重新索引后旧文档失效，合并时丢弃其倒排项，文档表也只保留最新文档
+        docs = self._load_docs()
+        merged: Dict[str, Dict[int, int]] = {}
+        for base in segments:
+            with open(base + '.terms', 'r', encoding='utf-8') as f_terms, open(base + '.post', 'rb') as f_post:
+                data = f_post.read()
+                for line in f_terms:
+                    term, offset, length = line.rstrip('\n').split('\t')
+                    offset, length = int(offset), int(length)
+                    live = {doc_id: tf for doc_id, tf in self._decode_postings(data[offset:offset + length]).items()
+                            if doc_id in docs}
+                    if live:
+                        merged.setdefault(term, {}).update(live)
+        target = segments[-1]
+        self._write_segment(target, merged)
+        for base in segments[:-1]:
+            os.remove(base + '.terms')
+            os.remove(base + '.post')
+        with open(self._docs_path + '.tmp', 'w', encoding='utf-8') as f:
+            for doc_id in sorted(docs):
+                f.write(json.dumps(docs[doc_id], ensure_ascii=False) + '\n')
+        os.replace(self._docs_path + '.tmp', self._docs_path)
+
+    @staticmethod
+    def _decode_postings(data: bytes) -> Dict[int, int]:
+        values = _decode_varints(data)
+        postings = {}
+        doc_id = 0
+        for i in range(0, len(values), 2):
+            doc_id += values[i]
+            postings[doc_id] = values[i + 1]
+        return postings
+
+    @staticmethod
+    def _lookup(mm, term: bytes) -> Optional[Tuple[int, int]]:
+        """在mmap的有序词典中二分查找词，返回(偏移, 长度)"""
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b'\n', 0, mid) + 1
+            end = mm.find(b'\n', start)
+            if end == -1:
+                end = len(mm)
+            key, offset, length = mm[start:end].split(b'\t')
+            if key == term:
+                return int(offset), int(length)
+            if key < term:
+                lo = end + 1
+            else:
+                hi = start
+        return None
+
+    def _load_docs(self) -> Dict[int, dict]:
+        """读取文档表，只保留每个路径的最新文档"""
+        latest: Dict[str, dict] = {}
+        if os.path.exists(self._docs_path):
+            with open(self._docs_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        doc = json.loads(line)
+                        latest[doc['path']] = doc
+        return {doc['id']: doc for doc in latest.values()}
+
+    def search(self, query: str, limit: int = 20) -> List[dict]:
+        """BM25排序查询，返回 [{path, title, score}]"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.flush()
+        docs = self._load_docs()
+        if not docs:
+            return []
+
+        # 收集各段中查询词的倒排列表
+        postings: Dict[str, Dict[int, int]] = {term: {} for term in terms}
+        for base in self._segments():
+            if os.path.getsize(base + '.terms') == 0:
+                continue
+            with open(base + '.terms', 'rb') as f_terms, open(base + '.post', 'rb') as f_post:
+                with mmap.mmap(f_terms.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for term in terms:
+                        found = self._lookup(mm, term.encode('utf-8'))
+                        if found:
+                            f_post.seek(found[0])
+                            postings[term].update(self._decode_postings(f_post.read(found[1])))
+
+        total = len(docs)
+        avg_len = sum(doc['len'] for doc in docs.values()) / total or 1
+        k1, b = 1.2, 0.75
+        scores: Dict[int, float] = {}
+        for term, term_postings in postings.items():
+            live = {doc_id: tf for doc_id, tf in term_postings.items() if doc_id in docs}
+            if not live:
+                continue
+            idf = math.log(1 + (total - len(live) + 0.5) / (len(live) + 0.5))
+            for doc_id, tf in live.items():
+                norm = tf * (k1 + 1) / (tf + k1 * (1 - b + b * docs[doc_id]['len'] / avg_len))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{'path': docs[doc_id]['path'], 'title': docs[doc_id]['title'], 'score': score}
+                for doc_id, score in ranked]
+
+    def rename_paths(self, moved: Dict[str, str]) -> int:
+        """文件移动后更新文档表中的路径，返回更新条数"""
+        with self._lock:
+            self._flush_locked()
+            if not os.path.exists(self._docs_path):
+                return 0
+            with open(self._docs_path, 'r', encoding='utf-8') as f:
+                docs = [json.loads(line) for line in f if line.strip()]
+            changed = 0
+            for doc in docs:
+                new_path = moved.get(doc['path'])
+                if new_path:
+                    doc['path'] = new_path
+                    changed += 1
+            if changed:
+                with open(self._docs_path + '.tmp', 'w', encoding='utf-8') as f:
+                    for doc in docs:
+                        f.write(json.dumps(doc, ensure_ascii=False) + '\n')
+                os.replace(self._docs_path + '.tmp', self._docs_path)
+                self._hashes = None
+            return changed
+
+    def update_from_directory(self, root: str) -> int:
+        """增量索引目录下尚未入库的小说文件（用于首次建库或补齐中断的写入），返回新增数量"""
+        with self._lock:
+            indexed = {doc['path'] for doc in self._pending_docs}
+        indexed.update(doc['path'] for doc in self._load_docs().values())
+
+        added = 0
+        for dirpath, _, filenames in os.walk(root):
+            for filename in sorted(filenames):
+                if not filename.endswith('.txt'):
+                    continue
+                path = os.path.normpath(os.path.join(dirpath, filename))
+                if path in indexed:
+                    continue
+                try:
+                    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                        content = f.read()
+                except OSError as e:
+                    logger.warning("读取小说失败 %s: %s", path, e)
+                    continue
+                self.add(path, filename[:-4], content)
+                added += 1
+        self.flush()
+        return added
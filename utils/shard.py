@@ -0,0 +1,134 @@
+import os
+import re
+import json
+import shutil
+import zlib
+from datetime import datetime
+from typing import Dict, List
+
+from utils.manifest import Manifest, read_jsonl, list_run_manifests, build_catalog
+from utils.layout import SaveLayout
+from utils.log import get_logger
+
+logger = get_logger('shard')
+
+_TOPIC_ID_RE = re.compile(r'/viewtopic/(\d+)')
+
+
+class ShardSpec:
+    """横向分片：按哈希把版块或帖子确定性地分配给 N 个工作进程中的第 i 个"""
+
+    def __init__(self, index: int = 0, count: int = 1, by: str = 'topic'):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f'无效的分片: {index}/{count}')
+        if by not in ('topic', 'forum'):
+            raise ValueError(f'未知的分片方式: {by}')
+        self.index = index
+        self.count = count
+        self.by = by
+
+    @classmethod
+    def parse(cls, spec: str, by: str = 'topic') -> 'ShardSpec':
+        """解析 'i/N' 格式的分片参数，i 从 0 开始"""
+        try:
+            index, count = (int(part) for part in spec.split('/'))
+        except ValueError:
+            raise ValueError(f'分片格式应为 i/N: {spec}')
+        return cls(index, count, by)
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def __str__(self) -> str:
+        return f'{self.index}/{self.count}'
+
+    def _owns(self, key: str) -> bool:
+        return zlib.crc32(key.encode('utf-8')) % self.count == self.index
+
+    def owns_forum(self, forum_id) -> bool:
+        """按版块分片时，判断版块是否属于本分片"""
+        if not self.enabled or self.by != 'forum':
+            return True
+        return self._owns(f'forum:{forum_id}')
+
+    def owns_topic(self, topic_url: str) -> bool:
+        """按帖子分片时，判断帖子是否属于本分片（按帖子ID哈希，无ID时按URL）"""
+        if not self.enabled or self.by != 'topic':
+            return True
+        match = _TOPIC_ID_RE.search(topic_url)
+        return self._owns(f'topic:{match.group(1) if match else topic_url}')
+
+
+def _shard_relpath(path: str, shard_dir: str) -> str:
+    """把分片清单中的路径转换为相对于分片目录的路径"""
+    path = os.path.normpath(path)
+    shard_dir = os.path.normpath(shard_dir)
+    if os.path.isabs(path) or path.startswith(shard_dir + os.sep):
+        return os.path.relpath(path, shard_dir)
+    # 分片以 --output-dir 运行后被下载到其他位置（如 CI 产物 shards/shard-0/）
+    prefix = os.path.basename(shard_dir) + os.sep
+    if path.startswith(prefix):
+        return path[len(prefix):]
+    return path
+
+
+def merge_shards(shard_dirs: List[str], manifest_dir: str = './manifests', shard_manifest_dir: str = 'manifests') -> Dict[str, int]:
+    """合并各分片的输出到当前目录：按清单复制文件、去除重复条目、合并清单和布局索引并重建目录
+
+    shard_dirs 中每个目录是一个分片的输出根目录（包含 picture/、novel/ 和 manifests/）
+    同一路径出现在多个分片时以保存时间最新的条目为准，内容哈希相同的文件不重复复制
+    """
+    stats = {'copied': 0, 'skipped': 0, 'missing': 0, 'manifests': 0}
+    latest: Dict[str, tuple] = {}
+
+    for shard_dir in shard_dirs:
+        source_dir = os.path.join(shard_dir, shard_manifest_dir)
+        for name in list_run_manifests(source_dir):
+            for entry in read_jsonl(os.path.join(source_dir, name)):
+                rel_path = _shard_relpath(entry['path'], shard_dir)
+                current = latest.get(rel_path)
+                if current is None or entry.get('time', '') >= current[1].get('time', ''):
+                    latest[rel_path] = (shard_dir, entry)
+
+    os.makedirs(manifest_dir, exist_ok=True)
+    merged_path = os.path.join(manifest_dir, f"run_{datetime.now().strftime('%Y%m%d-%H%M%S')}-merge.jsonl")
+    with open(merged_path, 'a', encoding='utf-8') as f_manifest:
+        for rel_path in sorted(latest):
+            shard_dir, entry = latest[rel_path]
+            src = os.path.join(shard_dir, rel_path)
+            if not os.path.exists(src):
+                logger.warning("分片文件缺失，跳过: %s", src)
+                stats['missing'] += 1
+                continue
+            if os.path.exists(rel_path) and Manifest.file_digest(rel_path)[1] == entry.get('sha256'):
+                stats['skipped'] += 1
+            else:
+                os.makedirs(os.path.dirname(rel_path) or '.', exist_ok=True)
+                shutil.copy2(src, rel_path)
+                stats['copied'] += 1
+            entry = dict(entry, path=rel_path)
+            f_manifest.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            stats['manifests'] += 1
+
+    _merge_layout_indexes(shard_dirs)
+    build_catalog(manifest_dir)
+    logger.summary("分片合并完成：复制 %d 个文件，跳过重复 %d 个，缺失 %d 个", stats['copied'], stats['skipped'], stats['missing'])
+    return stats
+
+
+def _merge_layout_indexes(shard_dirs: List[str]):
+    """合并各分片保存目录中的分片布局索引（按名称去重追加）"""
+    for shard_dir in shard_dirs:
+        for dirpath, _, filenames in os.walk(shard_dir):
+            if SaveLayout.INDEX_NAME not in filenames:
+                continue
+            target_dir = os.path.relpath(dirpath, shard_dir)
+            target = os.path.join(target_dir, SaveLayout.INDEX_NAME)
+            known = {entry['name'] for entry in read_jsonl(target)}
+            os.makedirs(target_dir, exist_ok=True)
+            with open(target, 'a', encoding='utf-8') as f:
+                for entry in read_jsonl(os.path.join(dirpath, SaveLayout.INDEX_NAME)):
+                    if entry['name'] not in known:
+                        known.add(entry['name'])
+                        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
@@ -0,0 +1,149 @@
+import os
+import atexit
+import queue
+import threading
+import zlib
+from typing import Callable, List, Optional, Set, Tuple
+from utils.log import get_logger
+
+logger = get_logger('writer')
+
+# 待写条目：(路径, 数据, 写入成功后的回调)
+_Item = Tuple[str, bytes, Optional[Callable[[], None]]]
+
+
+class WriteBehindWriter:
+    """后写式存储：采集线程只把已完成的内容放入队列，由专用I/O线程批量写盘
+
+    - 同一目录的文件固定由同一个I/O线程按提交顺序写入
+    - 待写数据总量超过 max_pending_bytes 时 submit 阻塞，限制内存占用
+    - 已创建的目录缓存在内存中，不再对每个文件调用 os.makedirs
+    - fsync: none（交给操作系统）、batch（每批写完后统一fsync）、always（每个文件写完立即fsync）
+    - close() 写完所有待写数据后返回，进程退出时也会自动调用
+    """
+
+    FSYNC_POLICIES = ('none', 'batch', 'always')
+
+    def __init__(self, workers: int = 2, max_pending_bytes: int = 64 * 1024 * 1024,
+                 batch_size: int = 32, fsync: str = 'none'):
+        if fsync not in self.FSYNC_POLICIES:
+            raise ValueError(f'未知的fsync策略: {fsync}')
+        self.max_pending_bytes = max_pending_bytes
+        self.batch_size = max(1, batch_size)
+        self.fsync = fsync
+        self.written = 0
+        self.failed = 0
+        self._pending_bytes = 0
+        self._condition = threading.Condition()
+        self._known_dirs: Set[str] = set()
+        self._dirs_lock = threading.Lock()
+        self._closed = False
+        self._queues: List[queue.Queue] = [queue.Queue() for _ in range(max(1, workers))]
+        self._threads = [
+            threading.Thread(target=self._run, args=(q,), name=f'writer-{i}', daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+        atexit.register(self.close)
+
+    def submit(self, path: str, data: bytes, on_written: Optional[Callable[[], None]] = None):
+        """提交一个待写文件，on_written在写入成功后由I/O线程调用（如记录清单、更新索引）"""
+        if self._closed:
+            raise RuntimeError('写入器已关闭')
+        size = len(data)
+        with self._condition:
+            # 单个文件超过上限时等待队列清空后放行，避免永久阻塞
+            while self._pending_bytes and self._pending_bytes + size > self.max_pending_bytes:
+                self._condition.wait()
+            self._pending_bytes += size
+        directory = os.path.dirname(path)
+        index = zlib.crc32(directory.encode('utf-8')) % len(self._queues)
+        self._queues[index].put((path, data, on_written))
+
+    def flush(self):
+        """等待已提交的数据全部写完"""
+        for q in self._queues:
+            q.join()
+
+    def close(self):
+        """写完所有待写数据并停止I/O线程"""
+        if self._closed:
+            return
+        self._closed = True
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+        if self.failed:
+            logger.warning("后台写入完成：成功 %d 个文件，失败 %d 个", self.written, self.failed)
+
+    def _ensure_dir(self, directory: str):
+        if not directory or directory in self._known_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with self._dirs_lock:
+            self._known_dirs.add(directory)
+
+    def _run(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            batch = [item]
+            # 取出队列中已有的条目合并为一批，最多batch_size个
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = q.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(item)
+            stop = batch[-1] is None
+            items = [entry for entry in batch if entry is not None]
+            try:
+                self._write_batch(items)
+            finally:
+                for _ in batch:
+                    q.task_done()
+            if stop:
+                return
+
+    def _write_batch(self, items: List[_Item]):
+        """按提交顺序写入一批文件；batch策略下整批写完再统一fsync，之后才调用回调"""
+        written = []
+        handles = []
+        for path, data, on_written in items:
+            try:
+                self._ensure_dir(os.path.dirname(path))
+                f = open(path, 'wb')
+                try:
+                    f.write(data)
+                    f.flush()
+                    if self.fsync == 'always':
+                        os.fsync(f.fileno())
+                    elif self.fsync == 'batch':
+                        handles.append(f)
+                        f = None
+                finally:
+                    if f is not None:
+                        f.close()
+                written.append(on_written)
+            except Exception as e:
+                logger.error("写入文件失败 %s: %s", path, e)
+        for f in handles:
+            try:
+                os.fsync(f.fileno())
+            except OSError as e:
+                logger.error("fsync失败 %s: %s", f.name, e)
+            finally:
+                f.close()
+        
+        for on_written in written:
+            if on_written:
+                try:
+                    on_written()
+                except Exception as e:
+                    logger.error("写入后回调失败: %s", e)
+        with self._condition:
+            self.written += len(written)
+            self.failed += len(items) - len(written)
+            self._pending_bytes -= sum(len(data) for _, data, _ in items)
+            self._condition.notify_all()